@@ -47,6 +47,10 @@ INSTALLED_APPS = [
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 MIDDLEWARE = [
+    # times the requests and the other middleware, adds the Server-Timing header (see catalog.instrumentation)
+    'catalog.middleware.RequestMetricsMiddleware',
+    # compresses the pages when the client accepts gzip, before any other middleware reads them
+    'catalog.middleware.HtmlGZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,6 +87,36 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # keep the connection open between requests (seconds)
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            # seconds to wait for a lock held by another connection (the cron jobs) before failing
+            'timeout': 20,
+        },
+    }
+}
+
+# Pragmas applied to every new SQLite connection (see catalog.signals).
+# In WAL mode readers don't block the writer and the writer doesn't block readers,
+# and synchronous=NORMAL is safe with WAL (a power loss may only lose the last transactions).
+# cache_size is in KiB when negative, mmap_size in bytes
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# File based, so that the cron jobs and the web server share it
+
+CACHES = {
+    'default': {
+        # counts the cache hits and misses of the requests
+        'BACKEND': 'catalog.instrumentation.InstrumentedFileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
     }
 }
 
@@ -125,6 +159,14 @@ STATIC_URL = '/static/'
 # Redirect to home URL after login (Default redirects to /accounts/profile/)
 LOGIN_REDIRECT_URL = '/'
 
+# Number of notifications shown in the navbar dropdown and per page of older ones
+NOTIFICATIONS_PAGE_SIZE = 10
+
+# Read notifications older than NOTIFICATION_RETENTION_DAYS are moved to the archive table,
+# NOTIFICATION_RETENTION_BATCH_SIZE at a time
+NOTIFICATION_RETENTION_DAYS = 30
+NOTIFICATION_RETENTION_BATCH_SIZE = 500
+
 # Log any email sent to the console
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
@@ -134,9 +176,41 @@ CRONJOBS = [
     # syntax: 'min hr day month weekday(0-6)'
     # run on Mondays at 00:01
     ('1 0 * * 0', 'catalog.cron.update_anime_table', f'>> {log_dir}'),
-    # run every 5 min
+    # run every 5 min, only the anime that are due according to their probe schedule are checked
     ('*/5 * * * *', 'catalog.cron.check_todays_anime', f'>> {log_dir}'),
+    # run every day at 04:00
+    ('0 4 * * *', 'catalog.cron.archive_notifications', f'>> {log_dir}'),
     # ('* * * * *', 'catalog.cron.scheduled_job', f'>> {log_dir}'),
 ]
 
 CRONTAB_COMMAND_SUFFIX = '2>&1'
+
+# Episode prober concurrency limits (simultaneous requests overall and per streaming website)
+PROBER_MAX_CONNECTIONS = 10
+PROBER_MAX_CONNECTIONS_PER_HOST = 4
+# Episode prober request timeout (seconds)
+PROBER_TIMEOUT = 30
+# How the prober looks for the latest aired episode: 'galloping' (exponential + binary search) or 'linear'
+PROBER_EPISODE_SEARCH = 'galloping'
+# Number of days a resolved streaming website url is reused before searching for it again
+STREAMING_LINK_TTL = 7
+# Minutes to wait before searching again for an anime that wasn't found on the streaming website,
+# doubled after every consecutive failure up to STREAMING_LINK_MAX_RETRY_DELAY
+STREAMING_LINK_RETRY_DELAY = 30
+STREAMING_LINK_MAX_RETRY_DELAY = 24 * 60
+
+# Probe scheduling (minutes): the anime is probed every PROBE_INTERVAL inside its expected release window,
+# then less and less often, up to PROBE_MAX_INTERVAL apart, until the episode is found.
+# Until its release delay can be predicted, new episodes are expected PROBE_DEFAULT_RELEASE_DELAY after
+# the broadcast, from PROBE_WINDOW_BEFORE before to PROBE_WINDOW_AFTER after that
+PROBE_DEFAULT_RELEASE_DELAY = 60
+PROBE_INTERVAL = 5
+PROBE_WINDOW_BEFORE = 30
+PROBE_WINDOW_AFTER = 120
+PROBE_MAX_INTERVAL = 120
+
+# Release delay prediction: the PREDICTOR_QUANTILES interval of the latest PREDICTOR_HISTORY release delays
+# of an anime, once at least PREDICTOR_MIN_SAMPLES of them are known
+PREDICTOR_HISTORY = 10
+PREDICTOR_MIN_SAMPLES = 3
+PREDICTOR_QUANTILES = (0.1, 0.9)
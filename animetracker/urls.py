@@ -32,6 +32,8 @@ urlpatterns = [
     path('accounts/profile', views.user_page, name='user-page'),
     path('accounts/profile/edit', views.edit_profile, name='edit-profile'),
     path('accounts/profile/edit-preferences', views.edit_preferences, name='edit-preferences'),
+    # before the django-notifications urls, so that it replaces their view
+    url('^inbox/notifications/mark-all-as-read/$', views.inbox_mark_all_as_read),
     url('^inbox/notifications/', include(notifications.urls, namespace='notifications')),
 
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
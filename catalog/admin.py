@@ -12,3 +12,35 @@ admin.site.register(UserProfile)
 class AnimeAdmin(admin.ModelAdmin):
     list_display = ('title', 'season', 'status', 'air_day')
     list_filter = ('air_day', 'status', 'season')
+
+
+@admin.register(StreamingLink)
+class StreamingLinkAdmin(admin.ModelAdmin):
+    list_display = ('anime', 'streaming_website', 'base_episode_url', 'resolved_at')
+    list_filter = ('streaming_website',)
+
+
+@admin.register(UnresolvedStreamingLink)
+class UnresolvedStreamingLinkAdmin(admin.ModelAdmin):
+    list_display = ('anime', 'streaming_website', 'failures', 'resolved_at', 'retry_at')
+    list_filter = ('streaming_website',)
+
+
+@admin.register(ProbeSchedule)
+class ProbeScheduleAdmin(admin.ModelAdmin):
+    list_display = ('anime', 'next_probe_at', 'found_at')
+
+
+@admin.register(EpisodeRelease)
+class EpisodeReleaseAdmin(admin.ModelAdmin):
+    list_display = ('anime', 'episode', 'first_seen_at', 'release_delay')
+
+
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'verb', 'timestamp')
+
+
+@admin.register(VisitCounter)
+class VisitCounterAdmin(admin.ModelAdmin):
+    list_display = ('name', 'visits')
@@ -0,0 +1,171 @@
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_GET
+
+from catalog.models import Anime, Genre, Season, Studio
+from catalog.pagination import paginate_keyset
+from catalog.versions import get_catalogue_version
+
+
+# default and maximum number of objects of a page
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# number of objects read per query by the export
+EXPORT_BATCH_SIZE = 500
+
+
+class Resource:
+    """A model exposed by the API.
+
+    A client selects the fields it needs with ?fields=id,title,... (the id is always included),
+    links are the many-to-many fields, returned as lists of ids:
+    field name -> (through table, its foreign key to the model, its foreign key to the related model)."""
+
+    def __init__(self, model, fields, default_fields=None, links=None, filters=()):
+        self.model = model
+        self.fields = fields
+        self.default_fields = default_fields or fields
+        self.links = links or {}
+        # fields that can be filtered on with ?field=value
+        self.filters = filters
+
+    def get_fields(self, request, default_fields=None):
+        """Returns the fields selected by the request. Raises ValueError if one doesn't exist."""
+        selected = [field for field in request.GET.get('fields', '').split(',') if field]
+        if not selected:
+            return default_fields or self.default_fields
+        unknown = [field for field in selected if field not in self.fields]
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(unknown)}.')
+        return list(dict.fromkeys(['id', *selected]))
+
+    def get_queryset(self, request, fields):
+        """Returns the objects matching the request's filters, with only the selected fields loaded."""
+        queryset = self.model.objects.only(*[field for field in fields if field not in self.links])
+        for field in self.filters:
+            values = request.GET.getlist(field)
+            if values:
+                queryset = queryset.filter(**{f'{field}__in': values})
+        return queryset
+
+    def get_links(self, field, pks):
+        """Returns a {pk: [related ids]} dictionary of a many-to-many field of the given objects."""
+        through, field_name, related_field_name = self.links[field]
+        links = {}
+        for pk, related_id in through.objects.filter(**{f'{field_name}__in': pks}) \
+                                             .order_by(related_field_name) \
+                                             .values_list(field_name, related_field_name):
+            links.setdefault(pk, []).append(related_id)
+        return links
+
+    def serialize(self, objects, fields):
+        """Returns the {field: value} dictionaries of the objects, with one query per many-to-many field."""
+        attnames = {field: self.model._meta.get_field(field).attname for field in fields if field not in self.links}
+        links = {field: self.get_links(field, [obj.pk for obj in objects]) for field in fields if field in self.links}
+        return [{field: links[field].get(obj.pk, []) if field in links else getattr(obj, attnames[field])
+                 for field in fields}
+                for obj in objects]
+
+
+RESOURCES = {
+    'anime': Resource(
+        Anime,
+        ['id', 'title', 'title_english', 'title_synonyms', 'mal_url', 'image_url', 'type', 'source', 'episodes',
+         'last_aired_episode', 'latest_ep_url', 'status', 'score', 'members', 'synopsis', 'season',
+         'airing_start', 'air_day', 'genres', 'studios'],
+        # the fields of the anime cards, lists are read far more often than the details
+        default_fields=['id', 'title', 'image_url', 'status', 'members', 'score', 'air_day', 'season'],
+        links={
+            'genres': (Anime.genres.through, 'anime_id', 'genre_id'),
+            'studios': (Anime.studios.through, 'anime_id', 'studio_id'),
+        },
+        filters=('status', 'air_day'),
+    ),
+    'genres': Resource(Genre, ['id', 'name', 'anime_count', 'airing_anime_count']),
+    'studios': Resource(Studio, ['id', 'name', 'anime_count', 'airing_anime_count']),
+    'seasons': Resource(Season, ['id', 'season', 'year']),
+}
+
+
+def get_etag(request, *args, **kwargs):
+    """Responses only change with the catalogue, so the ETag of an url is derived from the catalogue version
+    and a client revalidating an unchanged page gets a 304 without a single query."""
+    return hashlib.sha1(f'{get_catalogue_version()} {request.get_full_path()}'.encode()).hexdigest()
+
+
+def error_response(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def get_page_size(request):
+    """Returns the page size requested with ?limit=. Raises ValueError if it's invalid."""
+    page_size = request.GET.get('limit', str(PAGE_SIZE))
+    if not page_size.isdigit() or not 1 <= int(page_size) <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}.')
+    return int(page_size)
+
+
+@require_GET
+@condition(etag_func=get_etag)
+def resource_list(request, resource):
+    """JSON page of the objects of a resource ordered by id, the next page is the one after 'next_cursor'."""
+    if resource not in RESOURCES:
+        return error_response('Unknown resource.', 404)
+    resource = RESOURCES[resource]
+    try:
+        fields = resource.get_fields(request)
+        page = paginate_keyset(resource.get_queryset(request, fields), ['id'], get_page_size(request),
+                               after=request.GET.get('after'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    return JsonResponse({'results': resource.serialize(page.object_list, fields), 'next_cursor': page.next_cursor})
+
+
+@require_GET
+@condition(etag_func=get_etag)
+def resource_detail(request, resource, pk):
+    """JSON object of a resource, with all its fields unless some are selected."""
+    if resource not in RESOURCES:
+        return error_response('Unknown resource.', 404)
+    resource = RESOURCES[resource]
+    try:
+        fields = resource.get_fields(request, default_fields=resource.fields)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    obj = resource.get_queryset(request, fields).filter(pk=pk).first()
+    if obj is None:
+        return error_response('Not found.', 404)
+
+    return JsonResponse(resource.serialize([obj], fields)[0])
+
+
+def export_lines(resource, queryset, fields):
+    """Yields the objects as JSON lines, a batch at a time, reading the batches by id range,
+    so that neither the queryset nor a long-lived database cursor is held while the client reads."""
+    queryset = queryset.order_by('id')
+    objects = list(queryset[:EXPORT_BATCH_SIZE])
+    while objects:
+        yield ''.join(json.dumps(obj, cls=DjangoJSONEncoder) + '\n' for obj in resource.serialize(objects, fields))
+        if len(objects) < EXPORT_BATCH_SIZE:
+            return
+        objects = list(queryset.filter(id__gt=objects[-1].id)[:EXPORT_BATCH_SIZE])
+
+
+@require_GET
+@condition(etag_func=get_etag)
+def resource_export(request, resource):
+    """Streams all the objects of a resource as JSON lines, one object per line."""
+    if resource not in RESOURCES:
+        return error_response('Unknown resource.', 404)
+    resource = RESOURCES[resource]
+    try:
+        fields = resource.get_fields(request, default_fields=resource.fields)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    return StreamingHttpResponse(export_lines(resource, resource.get_queryset(request, fields), fields),
+                                 content_type='application/x-ndjson')
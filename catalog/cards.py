@@ -0,0 +1,28 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+
+# the card keys change with the anime's version, the timeout only lets the outdated cards expire
+ANIME_CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def anime_card_key(anime):
+    return f'anime-card-{anime.pk}-{anime.version}'
+
+
+def render_anime_cards(anime_list):
+    """Returns a list of (anime, card html) pairs.
+
+    The cards only depend on the anime, not on the user, so they are shared by everyone and cached
+    by anime id and version. They are read and written with a single get_many/set_many per page."""
+    keys = {anime.pk: anime_card_key(anime) for anime in anime_list}
+    cards = cache.get_many(keys.values())
+    missing = {}
+    for anime in anime_list:
+        if keys[anime.pk] not in cards:
+            missing[keys[anime.pk]] = render_to_string('catalog/anime_card.html', {'anime': anime})
+    if missing:
+        cache.set_many(missing, ANIME_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [(anime, mark_safe(cards[keys[anime.pk]])) for anime in anime_list]
@@ -0,0 +1,62 @@
+import hashlib
+from calendar import timegm
+
+from django.db.models import Count, Max
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from catalog.models import Anime, UserProfile
+from catalog.notifier import get_unread_count
+
+
+def get_user_state(user):
+    """Returns the values of the user's data shown on the pages: the navbar notifications and the watchlist buttons,
+    or None for anonymous users. Rows get increasing ids and removing rows lowers the counts,
+    so the (newest id, count) pairs change whenever the rows do."""
+    if not user.is_authenticated:
+        return None
+    notifications = user.notifications.aggregate(newest=Max('id'), count=Count('id'))
+    watchlist = UserProfile.watchlist.through.objects.filter(userprofile__user=user) \
+                                             .aggregate(newest=Max('id'), count=Count('id'))
+    return (user.pk, user.get_username(), get_unread_count(user),
+            notifications['newest'], notifications['count'], watchlist['newest'], watchlist['count'])
+
+
+class ConditionalGetMixin:
+    """View mixin answering 304 Not Modified, without rendering the page, when the client's copy is up to date.
+
+    The validators are computed with a query on the anime the page shows (get_shown_anime): their newest
+    updated_at is the Last-Modified, and the ETag also covers their number (deleting an anime doesn't change
+    the newest updated_at), the url and the CSRF secret of the client. For signed-in users, two more queries
+    (and the cached unread count) add their data to the ETag, see get_user_state."""
+
+    def get_shown_anime(self):
+        """Returns the anime whose data the page shows, all of them by default."""
+        return Anime.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        anime = self.get_shown_anime().aggregate(last_modified=Max('updated_at'), count=Count('id'))
+        if anime['last_modified'] is None:
+            # nothing to show, or a 404
+            return super().get(request, *args, **kwargs)
+
+        user_state = get_user_state(request.user)
+        # the forms of the pages carry a token of the CSRF secret, which login() rotates.
+        # get_token() creates the secret of a new client now, so that the ETag covers the one its page gets
+        get_token(request)
+        csrf_secret = request.META['CSRF_COOKIE']
+        etag = quote_etag(hashlib.sha1(repr((anime['last_modified'], anime['count'], user_state, csrf_secret,
+                                             request.get_full_path())).encode()).hexdigest())
+        # the user's data has no modification time, their pages are only validated by ETag
+        last_modified = timegm(anime['last_modified'].utctimetuple()) if user_state is None else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        # the pages may differ between users, and browsers must revalidate them instead of guessing their freshness
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,49 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from catalog.models import Anime, Genre, Studio
+
+
+# model -> (m2m through table, name of its foreign key to the model)
+COUNTED_MODELS = {
+    Genre: (Anime.genres.through, 'genre_id'),
+    Studio: (Anime.studios.through, 'studio_id'),
+}
+
+
+def _count(model, airing=False):
+    """Returns the subquery counting the anime of the outer model row."""
+    through, field_name = COUNTED_MODELS[model]
+    links = through.objects.filter(**{field_name: OuterRef('pk')})
+    if airing:
+        links = links.filter(anime__status='air')
+    count = links.order_by().values(field_name).annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(count, output_field=IntegerField()), 0)
+
+
+def get_anime_counts(model):
+    """Returns a {pk: (anime_count, airing_anime_count)} dictionary computed from the through table."""
+    return {pk: (anime_count, airing_anime_count)
+            for pk, anime_count, airing_anime_count in model.objects.annotate(actual_count=_count(model),
+                                                                               actual_airing_count=_count(model, True))
+                                                                     .values_list('pk', 'actual_count',
+                                                                                  'actual_airing_count')}
+
+
+def refresh_anime_counts(model, pks=None):
+    """Recounts the anime_count and airing_anime_count of the given Genre/Studio rows,
+    or all of them when pks is None, in a single UPDATE. Returns the number of rows updated."""
+    rows = model.objects.all()
+    if pks is not None:
+        pks = set(pks)
+        if not pks:
+            return 0
+        rows = rows.filter(pk__in=pks)
+    return rows.update(anime_count=_count(model), airing_anime_count=_count(model, airing=True))
+
+
+def refresh_anime_counts_of(anime_ids):
+    """Recounts the genres and studios of the given anime."""
+    for model, (through, field_name) in COUNTED_MODELS.items():
+        refresh_anime_counts(model, through.objects.filter(anime_id__in=anime_ids)
+                                                   .values_list(field_name, flat=True))
@@ -1,15 +1,21 @@
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db.models import Q
 from django.db.models.functions import datetime
+from django.utils import timezone
 
+from datetime import timedelta
 import json
 import requests
-import re
 import os
 
-from bs4 import BeautifulSoup
-from notifications.signals import notify
-
-from catalog.models import Genre, Season, Studio, Anime, UserProfile
+from catalog.models import Anime, StreamingLink, StreamingWebsite
+from catalog.ingest import ingest_schedule
+from catalog.notifier import archive_read_notifications, notify_watchers
+from catalog.prober import STREAMING_WEBSITE_URL, probe_anime
+from catalog.predictor import record_releases
+from catalog.scheduler import get_broadcast, get_due_anime, reschedule
+from catalog.stats import refresh_site_statistics
 
 
 # once a week get the weekly schedule
@@ -18,111 +24,15 @@ def update_anime_table():
     print(datetime.datetime.now().time())
     print('update anime table\n')
 
-    def get_season(air_date: str) -> Season:
-        """Retrieves the season from a date."""
-        year = air_date[:4]
-
-        str_month = air_date[5:7]
-        month = int(str_month)
-
-        # Jan -> Mar
-        if month < 4:
-            date_season = 'Winter'
-        # Apr -> Jun
-        elif month < 7:
-            date_season = 'Spring'
-        # Jul -> Sep
-        elif month < 10:
-            date_season = 'Summer'
-        # Oct -> Dec
-        else:
-            date_season = 'Fall'
-
-        return Season(season=date_season, year=year)
     # Get the current week's anime schedule
     schedule_response = requests.get("https://api.jikan.moe/v3/schedule")
     # Load the json file
     week_json = json.loads(schedule_response.content.decode('utf-8'))
-    days_of_the_week = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-    # Dictionary for storing this week's schedule
-    weekly_schedule = {
-        "Mon": [],
-        "Tue": [],
-        "Wed": [],
-        "Thu": [],
-        "Fri": [],
-        "Sat": [],
-        "Sun": []
-    }
-    # For each day of the week, create/update the respective anime entries
-    for day in days_of_the_week:
-        day_json = week_json[day]
-
-        for anime in day_json:
-            # Skip unpopular anime
-            if anime['members'] > 10000:
-                new_anime = Anime(mal_url=anime['url'],
-                                  title=anime['title'],
-                                  image_url=anime['image_url'],
-                                  synopsis=anime['synopsis'],
-                                  type=anime['type'],
-                                  episodes=anime['episodes'],
-                                  members=anime['members'],
-                                  source=anime['source'],
-                                  score=anime['score'],
-                                  status='air',
-                                  air_day=day[:3].capitalize())
-                # Turn anime['airing_start'] into Season
-                season = get_season(anime['airing_start'])
-                # Check if the season is already in the db
-                target_season = Season.objects.filter(season=season.season, year=season.year)
-                # If it is, assign it
-                if target_season.exists():
-                    new_anime.season = Season.objects.get(season=season.season, year=season.year)
-                # Otherwise, add it to the db and then assign it
-                else:
-                    new_season = Season(season=season.season, year=season.year)
-                    new_season.save()
-                    new_anime.season = new_season
-
-                # Add anime's id
-                new_anime.id = anime['mal_id']
-                # If anime was already in the db, save last aired episode
-                if Anime.objects.filter(id=new_anime.id).exists():
-                    new_anime.last_aired_episode = Anime.objects.get(id=new_anime.id).last_aired_episode
-                # Save anime to db
-                # We have to save the Anime entry before adding the Genre and Studio fields
-                # because it needs to have an id for the many-to-many relationships
-                new_anime.save()
-
-                # Get list of studio names
-                studio_list = []
-                for studio in anime['producers']:
-                    studio_list.append(studio['name'])
-                # For each studio name in the list
-                for studio in studio_list:
-                    # Check whether the studio is already in the db
-                    target_studio = Studio.objects.filter(name=studio)
-                    # If so, assign it to the anime's 'studios' field
-                    if target_studio.exists():
-                        new_anime.studios.add(Studio.objects.get(name=studio))
-                    # Otherwise, add it to the db then assign it
-                    else:
-                        new_studio = Studio(name=studio)
-                        new_studio.save()
-                        new_anime.studios.add(new_studio)
-
-                # Get list of genre names
-                genre_list = []
-                for genre in anime['genres']:
-                    genre_list.append(genre['name'])
-                # For each genre name in the list, assign the respective Genre object
-                for genre in genre_list:
-                    target_genre = Genre.objects.get(name=genre)
-                    new_anime.genres.add(target_genre)
-
-                # add anime to weekly schedule dictionary
-                weekly_schedule[new_anime.air_day].append(new_anime.pk)
+    # Create/update the anime entries in bulk and build this week's schedule
+    weekly_schedule, report = ingest_schedule(week_json)
+    print(f'{report}\n')
+    # the bulk writes don't send signals, recompute the home page counts
+    refresh_site_statistics()
 
     current_dir = os.path.abspath(os.path.dirname(__file__))
     # save weekly schedule to file
@@ -130,124 +40,149 @@ def update_anime_table():
         json.dump(weekly_schedule, file)
 
 
+def update_last_aired_episode(anime, last_aired_episode, base_episode_url, sender):
+    """Updates the last_aired_episode and latest_ep_url fields of the anime object.
+    In case a new episode was found, a notification is sent to all users who have
+    the anime in their watchlist, unless sender is None. Returns whether a new episode was found."""
+    # save current last aired ep number, episode url and status
+    prev_last_aired_episode = anime.last_aired_episode
+    prev_latest_ep_url = anime.latest_ep_url
+    prev_status = anime.status
+
+    anime.last_aired_episode = last_aired_episode
+    anime.latest_ep_url = f'{base_episode_url}{anime.last_aired_episode}'
+    # update status if it's the last episode in the anime
+    if anime.episodes == anime.last_aired_episode:
+        anime.status = 'fin'
+    # most checks find no new episode, don't write the row again
+    if (anime.last_aired_episode, anime.latest_ep_url, anime.status) == \
+            (prev_last_aired_episode, prev_latest_ep_url, prev_status):
+        return False
+    anime.save(update_fields=['last_aired_episode', 'latest_ep_url', 'status'])
+
+    # compare with new last aired ep value to see if it changed
+    # if it did, notify all users who have the anime on their watchlist
+    if anime.last_aired_episode != prev_last_aired_episode:
+        print(f'prev last aired ep = {prev_last_aired_episode}')
+        print(f'current last aired ep = {anime.last_aired_episode}')
+        if sender is None:
+            print('no sender for the notifications, no users notified')
+            return True
+        sent = notify_watchers(anime,
+                               sender=sender,
+                               verb=f'Episode {anime.last_aired_episode} of {anime.title} is now available!',
+                               description=f'{anime.get_absolute_url()}')
+        print(f'{sent} users notified')
+        return True
+    return False
+
+
+def update_streaming_link(link, anime, streaming_website, base_episode_url):
+    """Saves the result of searching for an anime on a streaming website.
+    After a failed search, the next one is delayed exponentially, up to STREAMING_LINK_MAX_RETRY_DELAY."""
+    if link is None:
+        link = StreamingLink(anime=anime, streaming_website=streaming_website)
+    link.resolved_at = timezone.now()
+    if base_episode_url is not None:
+        link.base_episode_url = base_episode_url
+        link.failures = 0
+        link.retry_at = None
+    else:
+        link.base_episode_url = ''
+        link.failures = link.failures + 1
+        retry_delay = min(settings.STREAMING_LINK_RETRY_DELAY * 2 ** (link.failures - 1),
+                          settings.STREAMING_LINK_MAX_RETRY_DELAY)
+        link.retry_at = link.resolved_at + timedelta(minutes=retry_delay)
+    link.save()
+    return link
+
+
 # once every 5 minutes, check if there are any new episodes
 def check_todays_anime():
-    """Checks and updates the last aired episode field for all anime scheduled to air today.
+    """Checks and updates the last aired episode field for the anime of the weekly schedule
+    that are due according to their probe schedule. Anime without a known broadcast time
+    are checked on every run of the day they are scheduled for.
     In case a new episode is found, a notification is sent to all users who have
     the anime in their watchlist."""
 
     print(datetime.datetime.now().time())
     print('check todays anime\n')
 
-    def check_for_new_episodes(anime):
-        """Checks whether new episodes of the anime have been made available on gogoanime.
-        In case a new episode is found, a notification is sent to all users who have
-        the anime in their watchlist. This also updates the last_aired_episode and
-        the latest_ep_url fields of the anime object."""
-
-        def episode_exists(local_ep_number):
-            """Checks whether the specified episode of the specified anime has aired.
-            If it did, update the anime's last aired field. Returns a boolean."""
-            episode_url = f'{base_episode_url}{local_ep_number}'
-            # print('Episode url: ', episode_url)
-            _response = requests.get(episode_url, headers=headers)
-            _soup = BeautifulSoup(_response.text, "html.parser")
-            if _soup.h1.text == '404':
-                # check the url to the next episode
-                # (fixes the issue of having a combined episode e.g. 4-5
-                # with a single url to ep 4 and no url to ep 5)
-                local_ep_number = local_ep_number + 1
-                episode_url = f'{base_episode_url}{local_ep_number}'
-                # print('Episode url: ', episode_url)
-                _response = requests.get(episode_url, headers=headers)
-                _soup = BeautifulSoup(_response.text, "html.parser")
-                if _soup.h1.text == '404':
-                    # print('404 Page not found')
-                    # update the last_aired_episode and latest_ep_url fields
-                    if local_ep_number > 2:
-                        anime.last_aired_episode = local_ep_number - 2
-                        anime.latest_ep_url = f'{base_episode_url}{anime.last_aired_episode}'
-                        # update status if it's the last episode in the anime
-                        if anime.episodes == anime.last_aired_episode:
-                            anime.status = 'fin'
-                        anime.save()
-                    return False
-            return True
-
-        streaming_website_url = 'https://gogoanime.pe/'
-        # define the search query (gogoanime-specific)
-        search_query = re.sub(r'[^a-zA-Z0-9-]', '%20', anime.title.lower())
-        search_query = search_query.replace('%20%20', '%20')
-        # search_query = search_query.replace(' ', '%20')
-        search_url = streaming_website_url + '/search.html?keyword=' + search_query
-
-        if search_url is not None:
-            # print('Search url:', search_url)
-
-            # set the headers like we are a browser,
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh;'
-                              'Intel Mac OS X 10_10_1)'
-                              'AppleWebKit/537.36 (KHTML, like Gecko)'
-                              'Chrome/39.0.2171.95'
-                              'Safari/537.36'
-            }
-            # download the search results page
-            response = requests.get(search_url, headers=headers)
-            # parse the downloaded page and grab all text
-            soup = BeautifulSoup(response.text, "html.parser")
-            # get the relative url to the anime page
-            anime_link = soup.find('a', attrs={'href': re.compile("^/category")})
-            # add it to the website's url to obtain the anime's url
-            if anime_link is not None:
-                anime_url = streaming_website_url + anime_link.get('href')
-                # print('Anime url:', anime_url)
-
-                # define the base url for specific episodes
-                base_episode_url = anime_url.replace('/category/', '') + '-episode-'
-                # print('Base episode url: ', base_episode_url)
-
-                # starting from the last episode we know of, or otherwise episode 1,
-                # check whether the page corresponding to that specific episode exists
-                # if it doesn't, update the last aired episode field
-                if anime.last_aired_episode is not None and anime.last_aired_episode != 0:
-                    ep_number = anime.last_aired_episode
-                    # print("last aired: ", anime.last_aired_episode)
-                else:
-                    ep_number = 1
-
-                # save current last aired ep number
-                prev_last_aired_episode = anime.last_aired_episode
-
-                while episode_exists(ep_number):
-                    ep_number = ep_number + 1
-
-                # compare with new last aired ep value to see if it changed
-                # if it did, notify all users who have the anime on their watchlist
-                if anime.last_aired_episode != prev_last_aired_episode:
-                    print(f'prev last aired ep = {prev_last_aired_episode}')
-                    print(f'current last aired ep = {anime.last_aired_episode}')
-                    user_profiles = UserProfile.objects.filter(watchlist__pk=anime.pk)
-                    admin_user = User.objects.get(username='adriana')
-                    for user_profile in user_profiles.iterator():
-                        notify.send(sender=admin_user,
-                                    recipient=user_profile.user,
-                                    verb=f'Episode {anime.last_aired_episode} of {anime.title} is now available!',
-                                    description=f'{anime.get_absolute_url()}')
-            else:
-                print(f'{anime.title} Anime url not found')
-                print(f'search url: {search_url}\n')
-        else:
-            print('Invalid streaming website')
-
     current_dir = os.path.abspath(os.path.dirname(__file__))
     json_path = os.path.join(current_dir, 'data/weekly_schedule.json')
 
     with open(json_path) as json_file:
         weekly_schedule = json.load(json_file)
-        today = datetime.datetime.now().strftime('%a')
-        for anime_id in weekly_schedule[today]:
-            check_for_new_episodes(Anime.objects.get(pk=anime_id))
+    today = datetime.datetime.now().strftime('%a')
+    this_week = [anime_id for day in weekly_schedule.values() for anime_id in day]
+    anime_by_id = Anime.objects.filter(Q(pk__in=weekly_schedule[today])
+                                       | Q(pk__in=this_week, airing_start__isnull=False)).in_bulk()
+    now = timezone.now()
+    # only keep the anime whose next probe time has come
+    anime_by_id = {anime_id: anime_by_id[anime_id] for anime_id in get_due_anime(anime_by_id, now)}
+    found_new_episode = set()
+
+    streaming_website, _ = StreamingWebsite.objects.get_or_create(url=STREAMING_WEBSITE_URL,
+                                                                  defaults={'name': 'GogoAnime'})
+    links = {link.anime_id: link for link in StreamingLink.objects.filter(anime__in=anime_by_id.keys(),
+                                                                          streaming_website=streaming_website)}
+    base_episode_urls = {}
+    skipped = []
+    for anime_id, link in links.items():
+        # reuse the episode urls resolved during the last STREAMING_LINK_TTL days
+        if link.base_episode_url and link.resolved_at >= now - timedelta(days=settings.STREAMING_LINK_TTL):
+            base_episode_urls[anime_id] = link.base_episode_url
+        # skip the anime that couldn't be found until their next retry
+        elif not link.base_episode_url and link.retry_at is not None and link.retry_at > now:
+            skipped.append(anime_id)
+
+    # notifications about new episodes are sent on behalf of the admin, none are sent if the account is gone
+    admin_user = User.objects.filter(username='adriana').first() if anime_by_id else None
+
+    # probe gogoanime for all the due anime concurrently,
+    # then write the results to the db one anime at a time
+    for result in probe_anime([anime for anime in anime_by_id.values() if anime.pk not in skipped],
+                              base_episode_urls):
+        anime = anime_by_id[result.anime_id]
+        if result.resolved:
+            links[anime.pk] = update_streaming_link(links.get(anime.pk), anime, streaming_website,
+                                                    result.base_episode_url)
+
+        if result.error is not None:
+            print(f'{anime.title} probe failed: {result.error!r}\n')
+        elif result.base_episode_url is None:
+            print(f'{anime.title} Anime url not found')
+            print(f'search url: {result.search_url}')
+            if result.title_similarity is not None:
+                print(f'closest search result similarity: {result.title_similarity:.2f}')
+            print(f'next search: {links[anime.pk].retry_at}\n')
+        else:
+            print(f'{anime.title}: {result.probes} episode pages probed')
+            prev_last_aired_episode = anime.last_aired_episode
+            if result.last_aired_episode is not None \
+                    and update_last_aired_episode(anime, result.last_aired_episode, result.base_episode_url,
+                                                  admin_user):
+                found_new_episode.add(anime.pk)
+                record_releases(anime, prev_last_aired_episode, now, get_broadcast(anime, now))
+
+    # schedule the next probes, this week's episodes that were found won't be probed again until next week
+    for anime in anime_by_id.values():
+        reschedule(anime, anime.pk in found_new_episode, now)
+
+    # saving the anime invalidated the home page counts, recompute them before the next visit
+    if anime_by_id:
+        refresh_site_statistics()
+
+
+# once a day, move old read notifications out of the notifications table
+def archive_notifications():
+    """Archives the read notifications older than NOTIFICATION_RETENTION_DAYS."""
+    print(datetime.datetime.now().time())
+    print('archive notifications\n')
+
+    moved, seconds = archive_read_notifications(settings.NOTIFICATION_RETENTION_DAYS,
+                                                settings.NOTIFICATION_RETENTION_BATCH_SIZE)
+    print(f'{moved} notifications archived in {seconds:.2f}s\n')
 
 
 def scheduled_job():
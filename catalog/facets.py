@@ -0,0 +1,161 @@
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from itertools import islice
+
+from catalog.local_index import LocalIndex
+from catalog.models import Anime, Genre, Season, Studio
+
+
+FACET_INDEX_VERSION_KEY = 'facet-index-version'
+
+# name: (label, multi-valued)
+# several values of a multi-valued facet must all match (Action and Comedy),
+# several values of a single-valued facet are alternatives (Saturday or Sunday)
+FACETS = {
+    'genre': ('Genre', True),
+    'studio': ('Studio', True),
+    'season': ('Season', False),
+    'status': ('Status', False),
+    'air_day': ('Air day', False),
+    'type': ('Type', False),
+}
+
+# a facet value with the number of anime of the current selection that have it
+FacetValue = namedtuple('FacetValue', ['value', 'label', 'count', 'selected'])
+
+
+def to_bitmap(positions, size):
+    """Returns the int whose bits at the given positions are set."""
+    bitmap = bytearray((size + 7) // 8)
+    for position in positions:
+        bitmap[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bitmap, 'little')
+
+
+def count_bits(bitmap):
+    return bin(bitmap).count('1')
+
+
+class FacetIndex:
+    """Bitmaps of the anime having every facet value.
+
+    The anime are numbered by id, bit i of a bitmap is set when the i-th anime has the value,
+    so filtering is an AND of bitmaps and counting the anime of a value is a popcount.
+    The (title, id) keys of the anime are kept sorted to read a page of the anime list without the database."""
+
+    def __init__(self, titles, facet_values, labels):
+        """titles maps each anime id to its title, facet_values maps each facet to its (anime_id, value) pairs,
+        labels maps each facet to a {value: label} dictionary."""
+        self.anime_ids = sorted(titles)
+        self.keys = sorted((title, anime_id) for anime_id, title in titles.items())
+        positions = {anime_id: position for position, anime_id in enumerate(self.anime_ids)}
+        self.all = (1 << len(self.anime_ids)) - 1
+        self.bitmaps = {}
+        self.labels = labels
+        for facet, pairs in facet_values.items():
+            value_positions = {}
+            for anime_id, value in pairs:
+                if value is not None and value != '' and anime_id in positions:
+                    value_positions.setdefault(value, []).append(positions[anime_id])
+            self.bitmaps[facet] = {value: to_bitmap(value_positions[value], len(self.anime_ids))
+                                   for value in value_positions}
+
+    def match(self, facet, values):
+        """Returns the bitmap of the anime matching the selected values of a facet."""
+        bitmaps = [self.bitmaps[facet].get(value, 0) for value in values]
+        if not bitmaps:
+            return self.all
+        bitmap = bitmaps[0]
+        for other_bitmap in bitmaps[1:]:
+            if FACETS[facet][1]:
+                bitmap &= other_bitmap
+            else:
+                bitmap |= other_bitmap
+        return bitmap
+
+    def select(self, selection, exclude=None):
+        """Returns the bitmap of the anime matching the selection, a {facet: [values]} dictionary,
+        except for the excluded facet."""
+        bitmap = self.all
+        for facet, values in selection.items():
+            if facet != exclude and values:
+                bitmap &= self.match(facet, values)
+        return bitmap
+
+    def get_anime_ids(self, bitmap):
+        """Returns the ids of the anime in a bitmap."""
+        return [self.anime_ids[position] for position, bit in enumerate(bin(bitmap)[:1:-1]) if bit == '1']
+
+    def get_page_anime_ids(self, bitmap, limit, after=None, before=None):
+        """Returns the ids of at most limit anime of a bitmap in (title, id) order, after the given
+        (title, id) key, or right before it in reverse order."""
+        anime_ids = set(self.get_anime_ids(bitmap))
+        if before is not None:
+            keys = reversed(self.keys[:bisect_left(self.keys, before)])
+        elif after is not None:
+            keys = self.keys[bisect_right(self.keys, after):]
+        else:
+            keys = self.keys
+        return list(islice((anime_id for _, anime_id in keys if anime_id in anime_ids), limit))
+
+    def count(self, selection):
+        """Returns {facet: [FacetValue]} with the number of anime of every value within the selection,
+        most frequent first. The values of a single-valued facet are counted without its own filter,
+        so that its other values stay selectable."""
+        facets = {}
+        for facet, (_, multi_valued) in FACETS.items():
+            selected = selection.get(facet, [])
+            bitmap = self.select(selection, exclude=None if multi_valued else facet)
+            values = [FacetValue(value, self.labels[facet].get(value, value), count_bits(bitmap & value_bitmap),
+                                 value in selected)
+                      for value, value_bitmap in self.bitmaps[facet].items()]
+            facets[facet] = sorted((value for value in values if value.count or value.selected),
+                                   key=lambda value: (-value.count, str(value.label)))
+        return facets
+
+
+def build_facet_index():
+    """Builds the facet index of the whole catalogue with one query per facet."""
+    anime = list(Anime.objects.values_list('pk', 'season', 'status', 'air_day', 'type', 'title'))
+    facet_values = {
+        'genre': Anime.genres.through.objects.values_list('anime_id', 'genre_id'),
+        'studio': Anime.studios.through.objects.values_list('anime_id', 'studio_id'),
+        'season': [(anime_id, season) for anime_id, season, _, _, _, _ in anime],
+        'status': [(anime_id, status) for anime_id, _, status, _, _, _ in anime],
+        'air_day': [(anime_id, air_day) for anime_id, _, _, air_day, _, _ in anime],
+        'type': [(anime_id, anime_type) for anime_id, _, _, _, anime_type, _ in anime],
+    }
+    labels = {
+        'genre': dict(Genre.objects.values_list('pk', 'name')),
+        'studio': dict(Studio.objects.values_list('pk', 'name')),
+        'season': {season.pk: str(season) for season in Season.objects.all()},
+        'status': dict(Anime._meta.get_field('status').choices),
+        'air_day': dict(Anime._meta.get_field('air_day').choices),
+        'type': {},
+    }
+    return FacetIndex({anime_id: title for anime_id, *_, title in anime}, facet_values, labels)
+
+
+facet_index = LocalIndex(FACET_INDEX_VERSION_KEY, build_facet_index)
+
+
+def get_facet_index():
+    """Returns this process' facet index, rebuilt when the catalogue changed since it was built."""
+    return facet_index.get()
+
+
+def invalidate_facet_index():
+    facet_index.invalidate()
+
+
+def parse_selection(query_dict):
+    """Returns the {facet: [values]} selection of a request's GET parameters.
+    Raises ValueError if an id is invalid."""
+    selection = {}
+    for facet in FACETS:
+        values = query_dict.getlist(facet)
+        if facet in ('genre', 'studio', 'season'):
+            values = [int(value) for value in values]
+        if values:
+            selection[facet] = values
+    return selection
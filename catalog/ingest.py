@@ -0,0 +1,221 @@
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from catalog.counters import refresh_anime_counts_of
+from catalog.facets import invalidate_facet_index
+from catalog.models import Genre, Season, Studio, Anime
+from catalog.search import index_anime
+from catalog.titles import invalidate_title_index
+from catalog.versions import bump_catalogue_version
+
+
+# number of rows written per INSERT/UPDATE statement
+BATCH_SIZE = 100
+
+# Anime fields that come from the Jikan schedule and are refreshed on every ingest.
+# last_aired_episode and latest_ep_url are owned by the episode checker and are never overwritten.
+SCHEDULE_FIELDS = ['mal_url', 'title', 'image_url', 'synopsis', 'type', 'episodes',
+                   'members', 'source', 'score', 'status', 'air_day', 'season', 'airing_start']
+# Anime fields that are only refreshed when the schedule entry has them (the v3 schedule doesn't)
+OPTIONAL_FIELDS = ['title_english', 'title_synonyms']
+
+
+@dataclass
+class IngestReport:
+    """Summary of a bulk ingest run."""
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    seasons_created: int = 0
+    studios_created: int = 0
+    genres_created: int = 0
+    links_created: int = 0
+    queries: int = 0
+
+    def __str__(self):
+        return (f'{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged, '
+                f'{self.seasons_created} seasons, {self.studios_created} studios and '
+                f'{self.genres_created} genres created, {self.links_created} m2m links created, '
+                f'{self.queries} queries')
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries issued while it is installed."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def get_season(air_date):
+    """Retrieves the (season, year) pair from a date."""
+    year = int(air_date[:4])
+    month = int(air_date[5:7])
+
+    # Jan -> Mar
+    if month < 4:
+        date_season = 'Winter'
+    # Apr -> Jun
+    elif month < 7:
+        date_season = 'Spring'
+    # Jul -> Sep
+    elif month < 10:
+        date_season = 'Summer'
+    # Oct -> Dec
+    else:
+        date_season = 'Fall'
+
+    return date_season, year
+
+
+def _resolve_by_name(model, names, report_field, report):
+    """Returns a {name: pk} dictionary for the given names, bulk creating the missing rows."""
+    existing = dict(model.objects.filter(name__in=names).values_list('name', 'pk'))
+    missing = [model(name=name) for name in sorted(names - existing.keys())]
+    if missing:
+        model.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+        # SQLite doesn't return the primary keys of bulk inserted rows, so read them back
+        existing.update(model.objects.filter(name__in=[m.name for m in missing]).values_list('name', 'pk'))
+        setattr(report, report_field, len(missing))
+    return existing
+
+
+def _resolve_seasons(keys, report):
+    """Returns a {(season, year): pk} dictionary for the given keys, bulk creating the missing rows."""
+    def load():
+        seasons = {}
+        for pk, season, year in Season.objects.filter(year__in={year for _, year in keys}) \
+                                              .order_by('pk').values_list('pk', 'season', 'year'):
+            # the table may contain duplicates, the oldest row wins
+            seasons.setdefault((season, year), pk)
+        return seasons
+
+    existing = load()
+    missing = [Season(season=season, year=year) for season, year in sorted(keys - existing.keys())]
+    if missing:
+        Season.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+        existing = load()
+        report.seasons_created = len(missing)
+    return existing
+
+
+def _link(through, field_name, wanted, report):
+    """Bulk inserts the missing (anime_id, <field_name>) rows of an m2m through table."""
+    anime_ids = {anime_id for anime_id, _ in wanted}
+    existing = set(through.objects.filter(anime_id__in=anime_ids).values_list('anime_id', field_name))
+    missing = [through(**{'anime_id': anime_id, field_name: other_id})
+               for anime_id, other_id in sorted(wanted - existing)]
+    through.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+    # the pages of the anime list their genres and studios
+    Anime.objects.filter(pk__in={link.anime_id for link in missing}).touch()
+    report.links_created += len(missing)
+    return missing
+
+
+def ingest_schedule(week_json, min_members=10000):
+    """Creates/updates the Anime table from a Jikan weekly schedule in a constant number of queries.
+
+    All the Season, Studio and Genre rows are resolved in memory up front and the missing ones
+    are created in bulk. Anime rows are then inserted or updated in batches and the studio/genre
+    links are written with bulk inserts, all inside a single transaction.
+    The search index and the anime counts of the affected genres and studios are updated in bulk as well.
+    Returns a (weekly_schedule, IngestReport) tuple."""
+    report = IngestReport()
+    weekly_schedule = {day: [] for day in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']}
+
+    # Collect the anime entries (the same anime can be listed on several days, the last one wins)
+    entries = {}
+    for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']:
+        for anime in week_json.get(day, []):
+            # Skip unpopular anime
+            if anime['members'] > min_members:
+                entries[anime['mal_id']] = (day[:3].capitalize(), anime)
+                weekly_schedule[day[:3].capitalize()].append(anime['mal_id'])
+
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter), transaction.atomic():
+        # Resolve all the dimensions up front
+        season_keys = {get_season(anime['airing_start']) for _, anime in entries.values() if anime['airing_start']}
+        studio_names = {studio['name'] for _, anime in entries.values() for studio in anime['producers']}
+        genre_names = {genre['name'] for _, anime in entries.values() for genre in anime['genres']}
+        seasons = _resolve_seasons(season_keys, report)
+        studios = _resolve_by_name(Studio, studio_names, 'studios_created', report)
+        genres = _resolve_by_name(Genre, genre_names, 'genres_created', report)
+
+        existing = Anime.objects.in_bulk(list(entries.keys()))
+        now = timezone.now()
+        fields = [Anime._meta.get_field(name) for name in SCHEDULE_FIELDS]
+        optional_fields = [Anime._meta.get_field(name) for name in OPTIONAL_FIELDS]
+        to_create = []
+        to_update = []
+        for mal_id, (air_day, anime) in entries.items():
+            new_anime = Anime(id=mal_id,
+                              mal_url=anime['url'],
+                              title=anime['title'],
+                              image_url=anime['image_url'],
+                              synopsis=anime['synopsis'],
+                              type=anime['type'],
+                              episodes=anime['episodes'],
+                              members=anime['members'],
+                              source=anime['source'],
+                              score=anime['score'],
+                              status='air',
+                              air_day=air_day)
+            if anime['airing_start']:
+                new_anime.season_id = seasons[get_season(anime['airing_start'])]
+                new_anime.airing_start = parse_datetime(anime['airing_start'])
+            entry_optional_fields = [field for field in optional_fields if field.name in anime]
+            for field in entry_optional_fields:
+                setattr(new_anime, field.attname, anime[field.name] or field.get_default())
+
+            old_anime = existing.get(mal_id)
+            if old_anime is None:
+                to_create.append(new_anime)
+                continue
+            changed = False
+            for field in fields + entry_optional_fields:
+                value = field.to_python(getattr(new_anime, field.attname))
+                if getattr(old_anime, field.attname) != value:
+                    setattr(old_anime, field.attname, value)
+                    changed = True
+            if changed:
+                old_anime.version = F('version') + 1
+                old_anime.updated_at = now
+                to_update.append(old_anime)
+            else:
+                report.unchanged += 1
+
+        Anime.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        Anime.objects.bulk_update(to_update,
+                                  [field.name for field in fields + optional_fields] + ['version', 'updated_at'],
+                                  batch_size=BATCH_SIZE)
+        report.inserted = len(to_create)
+        report.updated = len(to_update)
+        index_anime([anime.pk for anime in to_create + to_update])
+        if to_create or to_update:
+            invalidate_title_index()
+
+        # Write the m2m through tables
+        _link(Anime.studios.through, 'studio_id',
+              {(mal_id, studios[studio['name']]) for mal_id, (_, anime) in entries.items()
+               for studio in anime['producers']}, report)
+        _link(Anime.genres.through, 'genre_id',
+              {(mal_id, genres[genre['name']]) for mal_id, (_, anime) in entries.items()
+               for genre in anime['genres']}, report)
+
+        # bulk writes don't send signals, recount the genres/studios of the anime once at the end
+        if to_create or to_update or report.links_created:
+            refresh_anime_counts_of(list(entries.keys()))
+            # every process rebuilds its facet index on its next use
+            invalidate_facet_index()
+            bump_catalogue_version()
+
+    report.queries = counter.count
+    return weekly_schedule, report
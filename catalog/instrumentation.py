@@ -0,0 +1,169 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+# timings of the requests of all the processes by url name, every process merges its own into them periodically
+REQUEST_TIMINGS_KEY = 'request-timings'
+# seconds between the merges of a process' timings into the cache
+FLUSH_INTERVAL = 60
+# upper bounds (in ms) of the histogram buckets, the last bucket has no upper bound
+BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+# the phases of a request with a duration histogram
+PHASES = ['total', 'sql', 'template']
+
+
+class RequestMetrics:
+    """What a request spent its time on, durations are in seconds."""
+
+    def __init__(self):
+        self.total_time = 0.0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def get_server_timing(self):
+        """Returns the value of the Server-Timing header, which browsers show in their developer tools."""
+        return (f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries", '
+                f'template;dur={self.template_time * 1000:.1f}, '
+                f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses", '
+                f'total;dur={self.total_time * 1000:.1f}')
+
+
+# metrics of the request being handled, None outside of requests
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class QueryTimer:
+    """Database execute wrapper adding the number and duration of the queries to the request's metrics."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.metrics.sql_time += time.perf_counter() - start
+            self.metrics.queries += 1
+
+
+_missing = object()
+
+
+class CacheMetricsMixin:
+    """Cache backend mixin counting the hits and misses of the current request.
+    get_many() and incr() look up every key with get(), so they're counted per key."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        metrics = current_metrics.get()
+        if metrics is not None:
+            if value is _missing:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is _missing else value
+
+
+class InstrumentedFileBasedCache(CacheMetricsMixin, FileBasedCache):
+    pass
+
+
+def new_timings():
+    """Returns the empty timings of an url name: totals and a histogram of the duration of every phase."""
+    timings = {'requests': 0, 'queries': 0, 'cache_hits': 0, 'cache_misses': 0}
+    for phase in PHASES:
+        timings[f'{phase}_ms'] = 0.0
+        timings[phase] = [0] * (len(BUCKETS) + 1)
+    return timings
+
+
+def merge_timings(timings, other_timings):
+    """Adds other_timings to timings."""
+    for name, value in other_timings.items():
+        if isinstance(value, list):
+            timings[name] = [count + other_count for count, other_count in zip(timings[name], value)]
+        else:
+            timings[name] += value
+
+
+# timings recorded by this process since its last flush
+_pending_timings = {}
+_last_flush = time.monotonic()
+_lock = threading.Lock()
+
+
+def record_request(url_name, metrics):
+    """Adds the metrics of a request to this process' timings, merged into the cache every FLUSH_INTERVAL seconds,
+    so that recording a request costs no I/O."""
+    with _lock:
+        timings = _pending_timings.setdefault(url_name, new_timings())
+        timings['requests'] += 1
+        timings['queries'] += metrics.queries
+        timings['cache_hits'] += metrics.cache_hits
+        timings['cache_misses'] += metrics.cache_misses
+        for phase, duration in [('total', metrics.total_time), ('sql', metrics.sql_time),
+                                ('template', metrics.template_time)]:
+            timings[f'{phase}_ms'] += duration * 1000
+            timings[phase][bisect.bisect_left(BUCKETS, duration * 1000)] += 1
+        flush_due = time.monotonic() - _last_flush >= FLUSH_INTERVAL
+    if flush_due:
+        flush_request_timings()
+
+
+def flush_request_timings():
+    """Merges this process' timings into the timings of all the processes in the cache.
+    Processes flushing at the same time may overwrite each other's timings: they're statistics, not accounting."""
+    global _pending_timings, _last_flush
+    with _lock:
+        pending_timings, _pending_timings = _pending_timings, {}
+        _last_flush = time.monotonic()
+    if not pending_timings:
+        return
+    shared_timings = cache.get(REQUEST_TIMINGS_KEY) or {}
+    for url_name, timings in pending_timings.items():
+        merge_timings(shared_timings.setdefault(url_name, new_timings()), timings)
+    cache.set(REQUEST_TIMINGS_KEY, shared_timings, None)
+
+
+def get_request_timings():
+    """Returns the timings of all the processes by url name, including the ones this process hasn't flushed yet."""
+    flush_request_timings()
+    return cache.get(REQUEST_TIMINGS_KEY) or {}
+
+
+def reset_request_timings():
+    cache.delete(REQUEST_TIMINGS_KEY)
+
+
+def histogram_quantile(histogram, q):
+    """Returns the upper bound (in ms) of the bucket of the q-quantile of a histogram,
+    or None if it's in the last, unbounded, bucket or the histogram is empty."""
+    rank = q * sum(histogram)
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        if count and seen >= rank:
+            return BUCKETS[bucket] if bucket < len(BUCKETS) else None
+    return None
+
+
+def summarize_timings(timings):
+    """Returns the means, total duration quantiles and cache hit ratio of the timings of an url name."""
+    requests = timings['requests']
+    lookups = timings['cache_hits'] + timings['cache_misses']
+    return {
+        'requests': requests,
+        **{f'mean_{phase}_ms': round(timings[f'{phase}_ms'] / requests, 1) for phase in PHASES},
+        **{f'p{round(q * 100)}_total_ms': histogram_quantile(timings['total'], q) for q in (0.5, 0.95, 0.99)},
+        'mean_queries': round(timings['queries'] / requests, 1),
+        'cache_hit_ratio': round(timings['cache_hits'] / lookups, 2) if lookups else None,
+    }
@@ -0,0 +1,32 @@
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+class LocalIndex:
+    """An in-memory structure built from the database by every process.
+
+    Its version is shared through the cache: invalidate() gives it a new version
+    and every process rebuilds its copy the next time it's used."""
+
+    def __init__(self, version_key, build):
+        self.version_key = version_key
+        self.build = build
+        self.index = None
+        self.version = None
+
+    def get(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        if self.index is None or version != self.version:
+            self.index = self.build()
+            self.version = version
+        return self.index
+
+    def invalidate(self):
+        """Gives the index a new version once the current transaction is committed, so that a process
+        rebuilding it in the meantime from the old data doesn't store that copy under the new version."""
+        transaction.on_commit(lambda: cache.set(self.version_key, uuid.uuid4().hex, None))
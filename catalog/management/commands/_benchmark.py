@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test.utils import override_settings
+
+
+@contextmanager
+def temporary_database(copy=True, **settings_dict):
+    """Points the default database to a migrated copy of it (or to an empty database) in a
+    temporary directory, so that benchmarks never write to the real one. settings_dict overrides
+    the database settings. The cache is replaced by a local memory cache in the meantime.
+    Yields the path of the temporary database."""
+    db = connections.databases['default']
+    if db['ENGINE'] != 'django.db.backends.sqlite3':
+        raise CommandError('The benchmarks only support SQLite.')
+
+    connections.close_all()
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, 'benchmark.sqlite3')
+    if copy:
+        shutil.copyfile(db['NAME'], path)
+    original = {key: db[key] for key in ['NAME', *settings_dict] if key in db}
+    db.update(NAME=path, **settings_dict)
+    try:
+        # the rendered cards and statistics must not leak into the shared cache
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            call_command('migrate', verbosity=0)
+            yield path
+    finally:
+        connections.close_all()
+        for key in settings_dict:
+            db.pop(key, None)
+        db.update(original)
+        shutil.rmtree(tmp_dir)
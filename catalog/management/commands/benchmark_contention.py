@@ -0,0 +1,159 @@
+import multiprocessing
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from catalog.ingest import ingest_schedule
+from catalog.models import Genre
+from catalog.predictor import quantile
+from catalog.management.commands._benchmark import temporary_database
+
+
+# ids of the generated anime, far above the MyAnimeList ones
+FIRST_BENCHMARK_ID = 900000000
+
+
+def make_week(size, round_number):
+    """Generates a Jikan weekly schedule of size anime, whose members change with every round
+    so that every ingest updates all the rows."""
+    days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+    week = {day: [] for day in days}
+    for i in range(size):
+        week[days[i % 7]].append({
+            'mal_id': FIRST_BENCHMARK_ID + i,
+            'url': f'https://myanimelist.net/anime/{FIRST_BENCHMARK_ID + i}',
+            'title': f'Benchmark anime {i}',
+            'image_url': 'https://cdn.myanimelist.net/images/anime/1/1.jpg',
+            'synopsis': 'Benchmark synopsis. ' * 20,
+            'type': 'TV',
+            'episodes': 12,
+            'members': 20000 + i + round_number,
+            'source': 'Original',
+            'score': 7.5,
+            'airing_start': '2021-04-03T15:00:00+00:00',
+            'producers': [{'name': f'Benchmark studio {i % 20}'}],
+            'genres': [{'name': f'Benchmark genre {i % 10}'}, {'name': f'Benchmark genre {(i + 3) % 10}'}],
+        })
+    return week
+
+
+def write(size, deadline):
+    """Ingests the generated schedule until the deadline. Returns the ingest durations and errors."""
+    durations = []
+    errors = []
+    round_number = 1
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        try:
+            ingest_schedule(make_week(size, round_number))
+            durations.append(time.monotonic() - start)
+        except OperationalError as error:
+            errors.append(f'ingest: {error}')
+        round_number += 1
+    connection.close()
+    return durations, errors
+
+
+def read(urls, offset, deadline):
+    """Requests the urls in turn until the deadline. Returns the latencies by url and the errors."""
+    host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+    client = Client(HTTP_HOST=host)
+    latencies = {url: [] for url in urls}
+    errors = []
+    i = offset
+    while time.monotonic() < deadline:
+        url = urls[i % len(urls)]
+        start = time.monotonic()
+        try:
+            response = client.get(url)
+            if response.status_code != 200:
+                errors.append(f'{url}: status {response.status_code}')
+            else:
+                latencies[url].append(time.monotonic() - start)
+        except OperationalError as error:
+            errors.append(f'{url}: {error}')
+        i += 1
+    connection.close()
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = ('Runs the weekly ingest in a loop while hammering the list views, on a copy of the database, '
+            'and reports the p50/p99 latency of the requests.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=['tuned', 'stock'], default='tuned',
+                            help='tuned: the configured pragmas, timeout and persistent connections; '
+                                 'stock: SQLite and Django defaults')
+        parser.add_argument('--duration', type=float, default=20, help='Seconds to run for')
+        parser.add_argument('--readers', type=int, default=4, help='Number of concurrent readers')
+        parser.add_argument('--anime', type=int, default=500, help='Number of anime written by each ingest')
+
+    def handle(self, *args, **options):
+        if options['profile'] == 'tuned':
+            with temporary_database():
+                self.run_benchmark(options)
+        else:
+            with override_settings(SQLITE_PRAGMAS={}), temporary_database(CONN_MAX_AGE=0, OPTIONS={}) as path:
+                # journal_mode is stored in the database file
+                connections.close_all()
+                with sqlite3.connect(path) as conn:
+                    conn.execute('PRAGMA journal_mode = DELETE')
+                self.run_benchmark(options)
+
+    def run_benchmark(self, options):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        connection.close()
+        self.stdout.write(f'Profile: {options["profile"]} (journal_mode={journal_mode}), '
+                          f'{options["readers"]} readers, {options["anime"]} anime per ingest, '
+                          f'{options["duration"]:g}s')
+
+        # write the benchmark anime once so that the genre pages exist
+        ingest_schedule(make_week(options['anime'], 0))
+        genre = Genre.objects.filter(name='Benchmark genre 0').first()
+        connection.close()
+        urls = [reverse('anime'), reverse('airing-anime'), genre.get_absolute_url()]
+
+        # the readers are separate processes, like the web server workers and the cron jobs
+        deadline = time.monotonic() + options['duration']
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(options['readers']) as pool:
+            results = pool.starmap_async(read, [(urls, offset, deadline) for offset in range(options['readers'])])
+            ingests, errors = write(options['anime'], deadline)
+            results = results.get()
+
+        latencies = {url: [] for url in urls}
+        for reader_latencies, reader_errors in results:
+            for url, url_latencies in reader_latencies.items():
+                latencies[url].extend(url_latencies)
+            errors.extend(reader_errors)
+
+        for url, url_latencies in latencies.items():
+            self.stdout.write(self.format_latencies(url, url_latencies))
+        self.stdout.write(self.format_latencies('all requests', [latency for url_latencies in latencies.values()
+                                                                 for latency in url_latencies]))
+        self.stdout.write(self.format_latencies('ingest', ingests))
+        if errors:
+            for error in errors[:5]:
+                self.stdout.write(self.style.ERROR(error))
+            self.stdout.write(self.style.ERROR(f'{len(errors)} errors'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No errors'))
+
+    @staticmethod
+    def format_latencies(name, latencies):
+        if not latencies:
+            return f'{name}: no samples'
+        latencies = sorted(latencies)
+        return (f'{name}: {len(latencies)} samples, '
+                f'p50 {1000 * quantile(latencies, 0.5):.1f}ms, '
+                f'p99 {1000 * quantile(latencies, 0.99):.1f}ms, '
+                f'max {1000 * latencies[-1]:.1f}ms')
@@ -0,0 +1,82 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from catalog.management.commands._benchmark import temporary_database
+from catalog.models import Anime
+from catalog.predictor import quantile
+from catalog.search import index_anime, search_anime, search_anime_ids
+
+
+SYLLABLES = ['ka', 'shi', 'no', 'to', 'ri', 'mi', 'ya', 'ku', 'se', 'ra', 'ho', 'zu', 'ne', 'ta', 'ki', 'mo']
+
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = ('Fills an empty temporary database with generated anime and reports the latency of '
+            'full-text searches at each size, next to a LIKE scan of the anime table.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Numbers of anime')
+        parser.add_argument('--repeat', type=int, default=50, help='Number of times each query is run')
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            with temporary_database(copy=False):
+                self.run_benchmark(size, options['repeat'])
+
+    def run_benchmark(self, size, repeat):
+        rng = random.Random(size)
+        vocabulary = make_vocabulary(rng, 5000)
+        # a few words are very common, most are rare
+        weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+
+        start = time.monotonic()
+        for first_id in range(1, size + 1, 1000):
+            batch = [Anime(id=anime_id,
+                           mal_url=f'https://myanimelist.net/anime/{anime_id}',
+                           image_url='https://cdn.myanimelist.net/images/anime/1/1.jpg',
+                           title=' '.join(rng.choices(vocabulary, weights, k=rng.randint(2, 5))).title(),
+                           synopsis=' '.join(rng.choices(vocabulary, weights, k=40)).capitalize() + '.',
+                           type='TV', source='Original', members=rng.randint(10000, 2000000),
+                           status='air', air_day='Mon')
+                     for anime_id in range(first_id, min(first_id + 1000, size + 1))]
+            Anime.objects.bulk_create(batch)
+            index_anime([anime.pk for anime in batch])
+        self.stdout.write(f'{size} anime: generated and indexed in {time.monotonic() - start:.1f}s')
+
+        queries = {
+            'common word': vocabulary[0],
+            'rare word': vocabulary[-1],
+            'prefix': vocabulary[1][:3],
+            'two words': f'{vocabulary[2]} {vocabulary[40]}',
+            'no match': 'zzzz',
+        }
+        for name, query in queries.items():
+            matches = len(search_anime_ids(query, size))
+            self.stdout.write(f'  {name} ({query!r}, {matches} matches): '
+                              f'ids {self.time(lambda: search_anime_ids(query, 24), repeat)}, '
+                              f'cards {self.time(lambda: search_anime(query, 24), repeat)}')
+        query = vocabulary[-1]
+        scan = lambda: list(Anime.objects.filter(Q(title__icontains=query) | Q(synopsis__icontains=query))
+                                         .values_list('pk', flat=True)[:24])
+        self.stdout.write(f'  LIKE scan ({query!r}): {self.time(scan, max(repeat // 10, 1))}')
+
+    @staticmethod
+    def time(function, repeat):
+        """Runs the function repeat times and returns its p50/p99 latency."""
+        latencies = []
+        for _ in range(repeat):
+            start = time.monotonic()
+            function()
+            latencies.append(time.monotonic() - start)
+        latencies.sort()
+        return f'p50 {1000 * quantile(latencies, 0.5):.2f}ms p99 {1000 * quantile(latencies, 0.99):.2f}ms'
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from catalog.counters import COUNTED_MODELS, get_anime_counts, refresh_anime_counts
+from catalog.versions import bump_catalogue_version
+
+
+class Command(BaseCommand):
+    help = 'Checks the denormalized anime counts of the genres and studios against the m2m tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='Recount the rows that have drifted')
+
+    def handle(self, *args, **options):
+        total_drifted = 0
+        for model in COUNTED_MODELS:
+            actual = get_anime_counts(model)
+            drifted = []
+            for obj in model.objects.only('name', 'anime_count', 'airing_anime_count').order_by('name'):
+                anime_count, airing_anime_count = actual[obj.pk]
+                if (obj.anime_count, obj.airing_anime_count) != (anime_count, airing_anime_count):
+                    drifted.append(obj.pk)
+                    self.stdout.write(f'{model.__name__} {obj.name}: '
+                                      f'{obj.anime_count} anime ({obj.airing_anime_count} airing) stored, '
+                                      f'{anime_count} anime ({airing_anime_count} airing) linked')
+            if drifted and options['repair']:
+                refresh_anime_counts(model, drifted)
+                bump_catalogue_version()
+            total_drifted += len(drifted)
+
+        if not total_drifted:
+            self.stdout.write(self.style.SUCCESS('All the anime counts are correct.'))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {total_drifted} anime counts.'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{total_drifted} anime counts have drifted, '
+                                                 f'run with --repair to fix them.'))
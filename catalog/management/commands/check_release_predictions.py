@@ -0,0 +1,51 @@
+from datetime import timedelta
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+
+from catalog.models import EpisodeRelease
+from catalog.predictor import predict
+
+
+class Command(BaseCommand):
+    help = 'Reports how well the release delay predictor would have predicted the recorded releases.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('anime_ids', nargs='*', type=int, help='Only evaluate these anime')
+
+    def handle(self, *args, **options):
+        releases = EpisodeRelease.objects.filter(release_delay__isnull=False) \
+                                         .select_related('anime') \
+                                         .order_by('anime', 'episode')
+        if options['anime_ids']:
+            releases = releases.filter(anime__in=options['anime_ids'])
+
+        total_predictions = total_covered = 0
+        total_error = timedelta()
+        for anime, anime_releases in groupby(releases, key=lambda release: release.anime):
+            release_delays = [release.release_delay for release in anime_releases]
+            predictions = covered = 0
+            error = timedelta()
+            # predict every release from the ones before it
+            for i, release_delay in enumerate(release_delays):
+                prediction = predict(release_delays[:i])
+                if prediction is None:
+                    continue
+                predictions += 1
+                covered += prediction.covers(release_delay)
+                error += abs(release_delay - prediction.median)
+            if predictions:
+                self.stdout.write(f'{anime}: {predictions} predictions, '
+                                  f'mean error {error / predictions}, '
+                                  f'{100 * covered / predictions:.0f}% inside the predicted interval')
+            total_predictions += predictions
+            total_covered += covered
+            total_error += error
+
+        if total_predictions:
+            self.stdout.write(self.style.SUCCESS(f'Overall: {total_predictions} predictions, '
+                                                 f'mean error {total_error / total_predictions}, '
+                                                 f'{100 * total_covered / total_predictions:.0f}% '
+                                                 f'inside the predicted interval'))
+        else:
+            self.stdout.write('Not enough release history to evaluate the predictions.')
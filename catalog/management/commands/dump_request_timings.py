@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from catalog.instrumentation import BUCKETS, get_request_timings, reset_request_timings, summarize_timings
+
+
+def format_ms(bound):
+    return f'<={bound}' if bound is not None else f'>{BUCKETS[-1]}'
+
+
+class Command(BaseCommand):
+    help = 'Prints the request timings of every url name recorded by the RequestMetricsMiddleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the timings and histograms as JSON')
+        parser.add_argument('--reset', action='store_true', help='Clear the timings after printing them')
+
+    def handle(self, *args, **options):
+        timings = get_request_timings()
+        if options['json']:
+            self.stdout.write(json.dumps({'buckets_ms': BUCKETS, 'url_names': timings}, indent=2, sort_keys=True))
+        elif not timings:
+            self.stdout.write('No request timings recorded.')
+        else:
+            self.stdout.write(f'{"url name":<32} {"requests":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+                              f'{"mean ms":>8} {"sql ms":>8} {"queries":>8} {"tpl ms":>8} {"cache hit":>9}')
+            # the url names taking the most time overall first
+            for url_name, url_timings in sorted(timings.items(), key=lambda item: -item[1]['total_ms']):
+                summary = summarize_timings(url_timings)
+                hit_ratio = summary['cache_hit_ratio']
+                self.stdout.write(f'{url_name:<32} {summary["requests"]:>8} '
+                                  f'{format_ms(summary["p50_total_ms"]):>8} {format_ms(summary["p95_total_ms"]):>8} '
+                                  f'{format_ms(summary["p99_total_ms"]):>8} {summary["mean_total_ms"]:>8} '
+                                  f'{summary["mean_sql_ms"]:>8} {summary["mean_queries"]:>8} '
+                                  f'{summary["mean_template_ms"]:>8} '
+                                  f'{f"{hit_ratio:.0%}" if hit_ratio is not None else "-":>9}')
+
+        if options['reset']:
+            reset_request_timings()
+            self.stdout.write(self.style.SUCCESS('Cleared the request timings.'))
@@ -0,0 +1,44 @@
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from catalog.models import Anime
+
+
+# Jikan allows a few requests per second
+REQUEST_DELAY = 1
+
+
+class Command(BaseCommand):
+    help = ('Fetches the English title and the synonyms of the anime from Jikan '
+            '(the weekly schedule doesn\'t have them), for the fuzzy title index.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('anime_ids', nargs='*', type=int, help='Only fetch the titles of these anime')
+        parser.add_argument('--all', action='store_true',
+                            help='Also fetch the titles of the anime that already have alternative titles')
+
+    def handle(self, *args, **options):
+        anime_list = Anime.objects.only('title', 'title_english', 'title_synonyms', 'version')
+        if options['anime_ids']:
+            anime_list = anime_list.filter(pk__in=options['anime_ids'])
+        elif not options['all']:
+            anime_list = anime_list.filter(title_english='', title_synonyms=[])
+
+        updated = 0
+        for anime in anime_list:
+            response = requests.get(f'https://api.jikan.moe/v3/anime/{anime.pk}')
+            time.sleep(REQUEST_DELAY)
+            if response.status_code != 200:
+                self.stderr.write(f'{anime.title}: Jikan returned {response.status_code}')
+                continue
+            data = response.json()
+            title_english = data.get('title_english') or ''
+            title_synonyms = data.get('title_synonyms') or []
+            if (anime.title_english, anime.title_synonyms) != (title_english, title_synonyms):
+                anime.title_english = title_english
+                anime.title_synonyms = title_synonyms
+                anime.save(update_fields=['title_english', 'title_synonyms'])
+                updated += 1
+        self.stdout.write(self.style.SUCCESS(f'Updated the titles of {updated} anime.'))
@@ -0,0 +1,89 @@
+import time
+
+from django.db import connection
+from django.middleware.gzip import GZipMiddleware
+
+from catalog import api
+from catalog.instrumentation import QueryTimer, RequestMetrics, current_metrics, record_request
+
+
+class RequestMetricsMiddleware:
+    """Measures the wall time of every request, the number and time of its SQL queries, the time spent rendering
+    its template and its cache hits and misses.
+
+    The metrics are sent in a Server-Timing header and added to the histograms of the url name
+    (see catalog.instrumentation). The template time is measured for views returning a TemplateResponse
+    (the class-based views), the others render their template within the view. It goes first in the
+    MIDDLEWARE setting, so that the wall time covers the other middleware.
+
+    The queries of a streaming response run while the server sends it, after the middleware returned,
+    so it is measured until its content is consumed and gets no Server-Timing header (the headers are sent first)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        start = time.perf_counter()
+        response = self.measure(metrics, self.get_response, request)
+
+        if response.streaming:
+            response.streaming_content = self.measure_streaming_content(request, response.streaming_content,
+                                                                        metrics, start)
+            return response
+        metrics.total_time = time.perf_counter() - start
+        response['Server-Timing'] = metrics.get_server_timing()
+        self.record(request, metrics)
+        return response
+
+    def measure(self, metrics, function, *args):
+        """Calls the function with the metrics as the request's metrics and its queries timed."""
+        token = current_metrics.set(metrics)
+        try:
+            with connection.execute_wrapper(QueryTimer(metrics)):
+                return function(*args)
+        finally:
+            current_metrics.reset(token)
+
+    def measure_streaming_content(self, request, streaming_content, metrics, start):
+        """Yields the chunks of a streaming response, measuring the production of every chunk,
+        and records the request once the content is consumed (or the client went away)."""
+        chunks = iter(streaming_content)
+        try:
+            while True:
+                try:
+                    chunk = self.measure(metrics, next, chunks)
+                except StopIteration:
+                    break
+                yield chunk
+        finally:
+            metrics.total_time = time.perf_counter() - start
+            self.record(request, metrics)
+
+    def record(self, request, metrics):
+        # requests for unknown urls aren't aggregated, they would add an url name per typo
+        if request.resolver_match is not None:
+            record_request(request.resolver_match.view_name, metrics)
+
+    def process_template_response(self, request, response):
+        # the template response middleware run in reverse order, this one last, right before the rendering
+        metrics = current_metrics.get()
+        start = time.perf_counter()
+
+        def add_render_time(response):
+            metrics.template_time += time.perf_counter() - start
+
+        response.add_post_render_callback(add_render_time)
+        return response
+
+
+class HtmlGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware leaving the responses of the JSON API uncompressed.
+
+    GZipMiddleware turns the ETag of a compressed response into a weak one, the API responses
+    keep their strong ETags so that clients and caches can compare them byte for byte."""
+
+    def process_response(self, request, response):
+        if request.resolver_match is not None and request.resolver_match.func.__module__ == api.__name__:
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0039_remove_streamingwebsite_new_field'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StreamingLink',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base_episode_url', models.URLField(max_length=500)),
+                ('resolved_at', models.DateTimeField()),
+                ('anime', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.anime')),
+                ('streaming_website', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.streamingwebsite')),
+            ],
+            options={
+                'unique_together': {('anime', 'streaming_website')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0040_streaminglink'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnresolvedStreamingLink',
+            fields=[
+            ],
+            options={
+                'ordering': ['-failures'],
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('catalog.streaminglink',),
+        ),
+        migrations.AddField(
+            model_name='streaminglink',
+            name='failures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='streaminglink',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='streaminglink',
+            name='base_episode_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0041_auto_20261018_1942'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProbeSchedule',
+            fields=[
+                ('anime', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='catalog.anime')),
+                ('next_probe_at', models.DateTimeField(db_index=True)),
+                ('found_at', models.DateTimeField(blank=True, null=True)),
+                ('release_delay', models.DurationField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['next_probe_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='anime',
+            name='airing_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
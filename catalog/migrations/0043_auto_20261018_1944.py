@@ -0,0 +1,32 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0042_auto_20261018_1943'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='probeschedule',
+            name='release_delay',
+        ),
+        migrations.CreateModel(
+            name='EpisodeRelease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('episode', models.PositiveIntegerField()),
+                ('first_seen_at', models.DateTimeField()),
+                ('release_delay', models.DurationField(blank=True, null=True)),
+                ('anime', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.anime')),
+            ],
+            options={
+                'ordering': ['anime', 'episode'],
+                'unique_together': {('anime', 'episode')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0044_notificationarchive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anime',
+            index=models.Index(fields=['title', 'id'], name='catalog_ani_title_7a1b52_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anime',
+            index=models.Index(fields=['status', 'title', 'id'], name='catalog_ani_status_ca84d5_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0045_auto_20261018_1948'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anime',
+            index=models.Index(fields=['-members', 'id'], name='catalog_ani_members_ac465b_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:51
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_anime(apps, schema_editor):
+    for model_name in ['Genre', 'Studio']:
+        model = apps.get_model('catalog', model_name)
+        rows = list(model.objects.annotate(actual_count=Count('anime'),
+                                           actual_airing_count=Count('anime', filter=Q(anime__status='air'))))
+        for row in rows:
+            row.anime_count = row.actual_count
+            row.airing_anime_count = row.actual_airing_count
+        model.objects.bulk_update(rows, ['anime_count', 'airing_anime_count'], batch_size=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0046_auto_20261018_1950'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='genre',
+            name='airing_anime_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='anime_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studio',
+            name='airing_anime_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studio',
+            name='anime_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_anime, migrations.RunPython.noop),
+    ]
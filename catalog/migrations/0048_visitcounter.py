@@ -0,0 +1,21 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0047_auto_20261018_1951'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('visits', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
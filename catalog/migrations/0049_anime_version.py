@@ -0,0 +1,18 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0048_visitcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anime',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is specific to SQLite
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    # the prefix indexes keep the prefix queries of short words from scanning every matching term
+    schema_editor.execute("CREATE VIRTUAL TABLE catalog_anime_fts USING fts5("
+                          "title, synopsis, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')")
+    schema_editor.execute("INSERT INTO catalog_anime_fts (rowid, title, synopsis) "
+                          "SELECT id, title, COALESCE(synopsis, '') FROM catalog_anime")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE catalog_anime_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0049_anime_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.7 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0050_anime_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anime',
+            name='title_english',
+            field=models.CharField(blank=True, max_length=1000),
+        ),
+        migrations.AddField(
+            model_name='anime',
+            name='title_synonyms',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
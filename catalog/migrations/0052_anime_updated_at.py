@@ -0,0 +1,18 @@
+# Generated by Django 3.1.7 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0051_auto_20261018_2012'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anime',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
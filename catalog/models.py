@@ -1,13 +1,20 @@
+import copy
+
 from django.db import models
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.dispatch import receiver
 from django.db.models.signals import post_save
+from django.db.models.functions import Coalesce, Substr
+from django.utils import timezone
 
 
 class Genre(models.Model):
     """Model representing anime genre."""
     name = models.CharField(max_length=200, unique=True)
+    # number of anime of this genre (all of them and the currently airing ones), kept up to date by catalog.counters
+    anime_count = models.PositiveIntegerField(default=0)
+    airing_anime_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ['name']
@@ -22,7 +29,7 @@ class Genre(models.Model):
 
     @property
     def anime_ordered_by_members(self):
-        return self.anime_set.order_by('-members')
+        return self.anime_set.order_by('-members', 'id')
 
 
 class Season(models.Model):
@@ -48,6 +55,9 @@ class Season(models.Model):
 class Studio(models.Model):
     """Model representing a studio."""
     name = models.CharField(max_length=100, unique=True)
+    # number of anime of this studio (all of them and the currently airing ones), kept up to date by catalog.counters
+    anime_count = models.PositiveIntegerField(default=0)
+    airing_anime_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ['name']
@@ -61,6 +71,18 @@ class Studio(models.Model):
         return self.name
 
 
+class AnimeQuerySet(models.QuerySet):
+    def cards(self):
+        """Only selects the fields shown on anime cards and used to order them,
+        with the synopsis shortened by the database."""
+        return self.only('id', 'title', 'image_url', 'status', 'members', 'version') \
+                   .annotate(short_synopsis=Substr(Coalesce('synopsis', models.Value('')), 1, 128))
+
+    def touch(self):
+        """Marks the anime as modified, when data shown on their pages changed without them being saved."""
+        return self.update(updated_at=timezone.now())
+
+
 class Anime(models.Model):
     """Model representing an anime."""
     # id is the mal_id field
@@ -68,6 +90,9 @@ class Anime(models.Model):
     image_url = models.URLField()
     latest_ep_url = models.URLField(blank=True)
     title = models.CharField(max_length=1000)
+    # alternative titles, when Jikan provides them
+    title_english = models.CharField(max_length=1000, blank=True)
+    title_synonyms = models.JSONField(default=list, blank=True)
     type = models.TextField(max_length=50)
     source = models.TextField(max_length=50)
     episodes = models.IntegerField(null=True, blank=True)
@@ -83,6 +108,8 @@ class Anime(models.Model):
     members = models.IntegerField()
     synopsis = models.TextField(max_length=5000, null=True, blank=True)
     season = models.ForeignKey(Season, on_delete=models.SET_NULL, null=True)
+    # broadcast date and time of the first episode
+    airing_start = models.DateTimeField(null=True, blank=True)
     air_day = models.CharField(
         max_length=3,
         choices=[
@@ -97,14 +124,86 @@ class Anime(models.Model):
     )
     studios = models.ManyToManyField(Studio)
     genres = models.ManyToManyField(Genre)
+    # bumped on every write, the cached card of the anime is keyed by it
+    version = models.PositiveIntegerField(default=0)
+    # last change to the anime or to the data shown on its pages, the Last-Modified of the pages
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = AnimeQuerySet.as_manager()
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            # keyset pagination of the anime list and the currently airing anime list
+            models.Index(fields=['title', 'id']),
+            models.Index(fields=['status', 'title', 'id']),
+            # genre and studio pages, most popular first
+            models.Index(fields=['-members', 'id']),
+        ]
 
     def __str__(self):
         """String for representing the Model object."""
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        anime = super().from_db(db, field_names, values)
+        anime._loaded_values = anime.get_field_values(field_names)
+        return anime
+
+    def get_field_values(self, attnames):
+        """Returns the values of the given fields, the JSON values copied since they can be changed in place."""
+        return {attname: copy.deepcopy(self.__dict__[attname]) if isinstance(self.__dict__[attname], (list, dict))
+                else self.__dict__[attname]
+                for attname in attnames if attname in self.__dict__}
+
+    def get_changed_fields(self):
+        """Returns the names of the loaded fields changed since the anime was loaded or saved,
+        or None if it wasn't loaded from the db. Deferred fields read later don't count as changed."""
+        loaded_values = self.__dict__.get('_loaded_values')
+        if loaded_values is None:
+            return None
+        return {field.name for field in self._meta.concrete_fields
+                if field.attname in loaded_values and field.name not in ('version', 'updated_at')
+                and self.__dict__[field.attname] != loaded_values[field.attname]}
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        if '_loaded_values' in self.__dict__:
+            attnames = [self._meta.get_field(name).attname for name in fields] if fields is not None else \
+                       [field.attname for field in self._meta.concrete_fields]
+            self._loaded_values.update(self.get_field_values(attnames))
+
+    def save(self, *args, **kwargs):
+        """Saves the changed fields of the anime with a new data version.
+        Saving an anime loaded from the db that didn't change does nothing, and sends no signals."""
+        changed_fields = self.get_changed_fields()
+        if changed_fields is not None and not self._state.adding:
+            if kwargs.get('update_fields') is not None:
+                # the given fields that weren't loaded can't be compared, they're saved as asked
+                changed_fields = {name for name in kwargs['update_fields'] if name in changed_fields
+                                  or self._meta.get_field(name).attname not in self._loaded_values}
+            if not changed_fields:
+                return
+            kwargs['update_fields'] = changed_fields
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+
+        if self._state.adding:
+            self.version += 1
+            super().save(*args, **kwargs)
+        else:
+            # incremented by the db, concurrent writers can't both store the same version
+            version = self.__dict__.get('version')
+            self.version = models.F('version') + 1
+            super().save(*args, **kwargs)
+            # without reading it back: after a concurrent write, the version in memory is behind the db's
+            if version is not None:
+                self.version = version + 1
+            else:
+                del self.version
+        self._loaded_values = self.get_field_values(field.attname for field in self._meta.concrete_fields)
+
     def get_absolute_url(self):
         """Returns the url to access a detail record for this anime."""
         return reverse('anime-detail', args=[str(self.id)])
@@ -127,6 +226,75 @@ class StreamingWebsite(models.Model):
         return self.name
 
 
+class StreamingLink(models.Model):
+    """Model representing the resolved episode url of an anime on a streaming website."""
+    anime = models.ForeignKey(Anime, on_delete=models.CASCADE)
+    streaming_website = models.ForeignKey(StreamingWebsite, on_delete=models.CASCADE)
+    # the url of a specific episode is base_episode_url followed by the episode number
+    # empty if the anime couldn't be found on the streaming website
+    base_episode_url = models.URLField(max_length=500, blank=True)
+    resolved_at = models.DateTimeField()
+    # number of consecutive searches that didn't find the anime
+    failures = models.PositiveIntegerField(default=0)
+    # the anime won't be searched for again before this time
+    retry_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['anime', 'streaming_website']
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.anime} ({self.streaming_website})'
+
+
+class UnresolvedStreamingLinkManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(base_episode_url='')
+
+
+class UnresolvedStreamingLink(StreamingLink):
+    """Proxy model listing the anime that couldn't be found on a streaming website."""
+    objects = UnresolvedStreamingLinkManager()
+
+    class Meta:
+        proxy = True
+        ordering = ['-failures']
+
+
+class ProbeSchedule(models.Model):
+    """Model representing the next time an anime should be checked for new episodes.
+    Ordered by next_probe_at, the table is the prober's priority queue."""
+    anime = models.OneToOneField(Anime, on_delete=models.CASCADE, primary_key=True)
+    next_probe_at = models.DateTimeField(db_index=True)
+    # when the latest episode was found on the streaming website
+    found_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_probe_at']
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.anime} ({self.next_probe_at})'
+
+
+class EpisodeRelease(models.Model):
+    """Model representing when an episode of an anime was first seen on the streaming website."""
+    anime = models.ForeignKey(Anime, on_delete=models.CASCADE)
+    episode = models.PositiveIntegerField()
+    first_seen_at = models.DateTimeField()
+    # delay between the broadcast and the episode being found on the streaming website,
+    # only known for the episodes found by a probe soon after their broadcast
+    release_delay = models.DurationField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['anime', 'episode']
+        ordering = ['anime', 'episode']
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.anime} episode {self.episode}'
+
+
 class UserProfile(models.Model):
     """Model representing a user profile."""
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -149,3 +317,27 @@ class UserProfile(models.Model):
     def save_user_profile(sender, instance, **kwargs):
         instance.userprofile.save()
 
+
+class NotificationArchive(models.Model):
+    """Model representing a read notification moved out of the notifications table by the retention job."""
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE)
+    verb = models.CharField(max_length=255)
+    description = models.TextField(null=True, blank=True)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-timestamp']
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.recipient} {self.verb}'
+
+
+class VisitCounter(models.Model):
+    """Model representing the number of visits to a page, flushed from the cache by catalog.visits."""
+    name = models.CharField(max_length=100, unique=True)
+    visits = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.name}: {self.visits}'
@@ -0,0 +1,125 @@
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from notifications.models import Notification
+
+from catalog.models import NotificationArchive, UserProfile
+
+
+# number of notifications written per INSERT statement
+NOTIFICATION_BATCH_SIZE = 500
+# the unread counters are invalidated when notifications change, the timeout only bounds their staleness
+UNREAD_COUNT_CACHE_TIMEOUT = 60 * 60
+
+# a page of notifications, next_cursor is the id to pass as 'before' to get the next page, or None
+NotificationPage = namedtuple('NotificationPage', ['notifications', 'next_cursor'])
+
+
+def unread_count_key(user_id):
+    return f'notifications-unread-{user_id}'
+
+
+def get_unread_count(user):
+    """Returns the number of unread notifications of the user, cached until they change."""
+    key = unread_count_key(user.pk)
+    unread_count = cache.get(key)
+    if unread_count is None:
+        unread_count = user.notifications.unread().count()
+        cache.set(key, unread_count, UNREAD_COUNT_CACHE_TIMEOUT)
+    return unread_count
+
+
+def invalidate_unread_counts(user_ids):
+    cache.delete_many([unread_count_key(user_id) for user_id in user_ids])
+
+
+def mark_all_as_read(user):
+    """Marks all the user's notifications as read."""
+    user.notifications.mark_all_as_read()
+    cache.set(unread_count_key(user.pk), 0, UNREAD_COUNT_CACHE_TIMEOUT)
+
+
+def get_notifications_page(user, before=None):
+    """Returns the user's most recent NOTIFICATIONS_PAGE_SIZE notifications older than the 'before' id.
+
+    Newest first by id, which the (recipient_id) index already covers on SQLite."""
+    notifications = user.notifications.order_by('-id')
+    if before is not None:
+        notifications = notifications.filter(id__lt=before)
+    notifications = list(notifications[:settings.NOTIFICATIONS_PAGE_SIZE + 1])
+    if len(notifications) > settings.NOTIFICATIONS_PAGE_SIZE:
+        return NotificationPage(notifications[:-1], notifications[-2].id)
+    return NotificationPage(notifications, None)
+
+
+def notify_watchers(anime, sender, verb, description):
+    """Sends a notification to all users who have the anime in their watchlist.
+
+    Unlike notify.send, the notification rows are built in memory and bulk inserted,
+    so the number of queries doesn't grow with the number of users.
+    Returns the number of notifications sent."""
+    actor_content_type = ContentType.objects.get_for_model(sender)
+    timestamp = timezone.now()
+    recipient_ids = UserProfile.objects.filter(watchlist__pk=anime.pk).values_list('user_id', flat=True)
+
+    sent = 0
+    batch = []
+    for recipient_id in recipient_ids.iterator():
+        batch.append(Notification(recipient_id=recipient_id,
+                                  actor_content_type=actor_content_type,
+                                  actor_object_id=sender.pk,
+                                  verb=verb,
+                                  description=description,
+                                  public=True,
+                                  timestamp=timestamp,
+                                  level=Notification.LEVELS.info))
+        if len(batch) == NOTIFICATION_BATCH_SIZE:
+            sent += send_batch(batch)
+            batch = []
+    return sent + send_batch(batch)
+
+
+def send_batch(notifications):
+    Notification.objects.bulk_create(notifications)
+    invalidate_unread_counts({notification.recipient_id for notification in notifications})
+    return len(notifications)
+
+
+def archive_read_notifications(days, batch_size):
+    """Moves the read notifications older than the given number of days to the archive table.
+
+    Each batch of at most batch_size notifications is copied and deleted in its own short
+    transaction, so the database isn't locked for the whole run.
+    Returns a (notifications moved, seconds spent) tuple."""
+    start = time.monotonic()
+    cutoff = timezone.now() - timedelta(days=days)
+    old_notifications = Notification.objects.filter(unread=False, timestamp__lt=cutoff).order_by('id')
+
+    moved = 0
+    while True:
+        with transaction.atomic():
+            batch = list(old_notifications.values('id', 'recipient_id', 'verb', 'description', 'timestamp')
+                         [:batch_size])
+            if not batch:
+                break
+            NotificationArchive.objects.bulk_create([
+                NotificationArchive(recipient_id=notification['recipient_id'],
+                                    verb=notification['verb'],
+                                    description=notification['description'],
+                                    timestamp=notification['timestamp'])
+                for notification in batch])
+            # nothing references the notifications and they're read, a plain DELETE skips
+            # collecting the rows and sending a post_delete signal for each of them
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {Notification._meta.db_table} '
+                               f'WHERE id IN ({", ".join(["%s"] * len(batch))})',
+                               [notification['id'] for notification in batch])
+        moved += len(batch)
+
+    return moved, time.monotonic() - start
@@ -0,0 +1,91 @@
+import base64
+import binascii
+import json
+from collections import namedtuple
+
+from django.db.models import Q
+from django.http import Http404
+
+
+# a page of objects with the cursors of the pages around it, None if there is no such page
+KeysetPage = namedtuple('KeysetPage', ['object_list', 'previous_cursor', 'next_cursor'])
+
+
+def encode_cursor(obj, ordering):
+    """Encodes the ordering field values of an object into an url-safe cursor."""
+    values = [getattr(obj, field.lstrip('-')) for field in ordering]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, ordering):
+    """Decodes a cursor into a list of ordering field values. Raises ValueError if it's invalid."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError):
+        raise ValueError(f'Invalid cursor {cursor!r}')
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise ValueError(f'Invalid cursor {cursor!r}')
+    # a crafted cursor could hold lists or objects, which the lookups would choke on
+    if not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        raise ValueError(f'Invalid cursor {cursor!r}')
+    return values
+
+
+def keyset_filter(ordering, values, after):
+    """Returns the Q object selecting the rows after (or before) the given values in the ordering."""
+    condition = Q()
+    for i in reversed(range(len(ordering))):
+        equal = {field.lstrip('-'): value for field, value in zip(ordering[:i], values[:i])}
+        # a descending field is after the value when it's lower
+        lookup = 'gt' if after != ordering[i].startswith('-') else 'lt'
+        condition = Q(**equal, **{f'{ordering[i].lstrip("-")}__{lookup}': values[i]}) | condition
+    return condition
+
+
+def reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def paginate_keyset(queryset, ordering, page_size, after=None, before=None):
+    """Returns the KeysetPage of at most page_size objects after or before the given cursor.
+
+    The queryset is ordered by the ordering fields ('-' prefixed when descending), which must be
+    unique together, and every page is read with a range condition on them, so page N costs the
+    same as the first page."""
+    if before is not None:
+        values = decode_cursor(before, ordering)
+        objects = list(queryset.filter(keyset_filter(ordering, values, after=False))
+                               .order_by(*reverse_ordering(ordering))[:page_size + 1])
+        has_previous, has_next = len(objects) > page_size, True
+        objects = objects[:page_size][::-1]
+    else:
+        queryset = queryset.order_by(*ordering)
+        if after is not None:
+            queryset = queryset.filter(keyset_filter(ordering, decode_cursor(after, ordering), after=True))
+        objects = list(queryset[:page_size + 1])
+        has_previous, has_next = after is not None, len(objects) > page_size
+        objects = objects[:page_size]
+
+    if not objects:
+        return KeysetPage(objects, None, None)
+    return KeysetPage(objects,
+                      encode_cursor(objects[0], ordering) if has_previous else None,
+                      encode_cursor(objects[-1], ordering) if has_next else None)
+
+
+class KeysetPaginationMixin:
+    """ListView mixin paginating with 'after'/'before' cursors over the keyset_ordering fields
+    instead of page numbers. The template gets the KeysetPage as page_obj.
+    Other views can call paginate_queryset themselves."""
+    keyset_ordering = ['title', 'id']
+    paginate_by = 24
+
+    def paginate_queryset(self, queryset, page_size):
+        try:
+            page = paginate_keyset(queryset, self.keyset_ordering, page_size,
+                                   after=self.request.GET.get('after'),
+                                   before=self.request.GET.get('before'))
+        except ValueError:
+            raise Http404('Invalid page.')
+        is_paginated = page.previous_cursor is not None or page.next_cursor is not None
+        return None, page, page.object_list, is_paginated
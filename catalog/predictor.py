@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+
+from catalog.models import EpisodeRelease
+
+
+@dataclass
+class ReleasePrediction:
+    """Predicted delay between the broadcast of an episode and its release on the streaming website."""
+    low: timedelta
+    median: timedelta
+    high: timedelta
+    samples: int
+
+    def covers(self, release_delay):
+        """Checks whether a delay falls inside the predicted interval."""
+        return self.low <= release_delay <= self.high
+
+
+def quantile(sorted_values, q):
+    """Returns the q-quantile of a sorted list, interpolating between the closest ranks."""
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def predict(release_delays):
+    """Predicts the next release delay from the previous ones, or returns None if there are too few of them.
+
+    The prediction is the median of the latest PREDICTOR_HISTORY delays, within the
+    PREDICTOR_QUANTILES interval."""
+    release_delays = sorted(release_delays[-settings.PREDICTOR_HISTORY:])
+    if len(release_delays) < settings.PREDICTOR_MIN_SAMPLES:
+        return None
+    low, high = settings.PREDICTOR_QUANTILES
+    return ReleasePrediction(low=quantile(release_delays, low),
+                             median=quantile(release_delays, 0.5),
+                             high=quantile(release_delays, high),
+                             samples=len(release_delays))
+
+
+def predict_release_delay(anime):
+    """Predicts the release delay of the anime's next episode from its history."""
+    release_delays = EpisodeRelease.objects.filter(anime=anime, release_delay__isnull=False) \
+                                           .order_by('-episode') \
+                                           .values_list('release_delay', flat=True)[:settings.PREDICTOR_HISTORY]
+    return predict(list(reversed(release_delays)))
+
+
+def record_releases(anime, prev_last_aired_episode, seen_at, broadcast=None):
+    """Records the episodes found since prev_last_aired_episode as first seen at seen_at.
+
+    The release delay is only recorded for the latest episode, when it was found by probing
+    an anime whose previous episode was already known and its broadcast time is given."""
+    first_episode = (prev_last_aired_episode or 0) + 1
+    releases = [EpisodeRelease(anime=anime, episode=episode, first_seen_at=seen_at)
+                for episode in range(first_episode, anime.last_aired_episode + 1)]
+    if releases and prev_last_aired_episode is not None and broadcast is not None and broadcast <= seen_at:
+        releases[-1].release_delay = seen_at - broadcast
+    EpisodeRelease.objects.bulk_create(releases, ignore_conflicts=True)
+    return releases
@@ -0,0 +1,239 @@
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+import aiohttp
+from bs4 import BeautifulSoup
+from django.conf import settings
+
+from catalog.titles import get_titles, normalize_title, similarity
+
+
+STREAMING_WEBSITE_URL = 'https://gogoanime.pe/'
+# minimum similarity between a search result and one of the anime's titles for it to be picked
+MIN_TITLE_SIMILARITY = 0.4
+
+# set the headers like we are a browser
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh;'
+                  'Intel Mac OS X 10_10_1)'
+                  'AppleWebKit/537.36 (KHTML, like Gecko)'
+                  'Chrome/39.0.2171.95'
+                  'Safari/537.36'
+}
+
+
+@dataclass
+class ProbeResult:
+    """Outcome of probing the streaming website for a single anime."""
+    anime_id: int
+    base_episode_url: Optional[str] = None
+    last_aired_episode: Optional[int] = None
+    search_url: Optional[str] = None
+    # similarity between the picked search result and the anime's titles
+    title_similarity: Optional[float] = None
+    # number of episode pages downloaded
+    probes: int = 0
+    # whether the base episode url was looked up with the website's search
+    resolved: bool = False
+    error: Optional[BaseException] = None
+
+
+def get_search_url(title):
+    """Returns the gogoanime search url for an anime title."""
+    # define the search query (gogoanime-specific), the words of the title without accents and punctuation
+    search_query = '%20'.join(re.findall(r'[a-z0-9]+', normalize_title(title)))
+    return STREAMING_WEBSITE_URL + '/search.html?keyword=' + search_query
+
+
+def get_search_results(search_page):
+    """Returns the (title, relative url) pairs of the anime found in a search results page, in order."""
+    soup = BeautifulSoup(search_page, "html.parser")
+    results = {}
+    # get the relative urls to the anime pages
+    for anime_link in soup.find_all('a', attrs={'href': re.compile("^/category")}):
+        title = anime_link.get('title') or anime_link.get_text(strip=True)
+        # the same anime is linked from its thumbnail and its name
+        if title or anime_link.get('href') not in results:
+            results[anime_link.get('href')] = title
+    return [(title, href) for href, title in results.items()]
+
+
+def get_base_episode_url(search_page, titles=None):
+    """Returns the base url for specific episodes found in a search results page, or None.
+
+    When the anime's titles are given, the result whose title is the most similar to one of them
+    is picked, if it's similar enough, instead of the first one.
+    Returns a (base episode url, similarity) tuple, the similarity is None without titles."""
+    results = get_search_results(search_page)
+    if not results:
+        return None, None
+    if titles is None:
+        best_similarity, href = None, results[0][1]
+    else:
+        # the first of the most similar results wins
+        best_similarity, href = max(((max(similarity(title, anime_title) for anime_title in titles), href)
+                                     for title, href in results if title),
+                                    key=lambda result: result[0], default=(0.0, None))
+        if best_similarity < MIN_TITLE_SIMILARITY:
+            return None, best_similarity
+    # add it to the website's url to obtain the anime's url
+    anime_url = STREAMING_WEBSITE_URL + href
+    return anime_url.replace('/category/', '') + '-episode-', best_similarity
+
+
+def is_missing_page(status, page):
+    """Checks whether a downloaded episode page is gogoanime's 404 page."""
+    if status == 404:
+        return True
+    h1 = BeautifulSoup(page, "html.parser").h1
+    return h1 is None or h1.text == '404'
+
+
+class EpisodeSearch:
+    """Searches for the first episode of an anime that hasn't aired yet.
+
+    Every episode page is downloaded at most once, so the number of
+    pages in the cache is the number of requests made."""
+
+    def __init__(self, prober, base_episode_url):
+        self.prober = prober
+        self.base_episode_url = base_episode_url
+        self.pages = {}
+
+    @property
+    def probes(self):
+        return len(self.pages)
+
+    async def page_exists(self, ep_number):
+        """Checks whether the page of the specified episode exists."""
+        if ep_number not in self.pages:
+            status, page = await self.prober.fetch(f'{self.base_episode_url}{ep_number}')
+            self.pages[ep_number] = not is_missing_page(status, page)
+        return self.pages[ep_number]
+
+    async def episode_exists(self, ep_number):
+        """Checks whether the specified episode has aired."""
+        # check the url to the next episode as well
+        # (fixes the issue of having a combined episode e.g. 4-5
+        # with a single url to ep 4 and no url to ep 5)
+        return await self.page_exists(ep_number) or await self.page_exists(ep_number + 1)
+
+    async def linear(self, ep_number):
+        """Walks forward one episode at a time from ep_number."""
+        while await self.episode_exists(ep_number):
+            ep_number = ep_number + 1
+        return ep_number
+
+    async def galloping(self, ep_number):
+        """Probes ep_number, ep_number + 1, ep_number + 3, ep_number + 7, ...
+        until an episode that hasn't aired is found, then binary searches the boundary."""
+        if not await self.episode_exists(ep_number):
+            return ep_number
+        # the last episode known to have aired and the gap to the next probe
+        low, step = ep_number, 1
+        while await self.episode_exists(low + step):
+            low = low + step
+            step = step * 2
+        high = low + step
+        while high - low > 1:
+            middle = (low + high) // 2
+            if await self.episode_exists(middle):
+                low = middle
+            else:
+                high = middle
+        return high
+
+
+class EpisodeProber:
+    """Probes gogoanime for new episodes of several anime concurrently.
+
+    The number of simultaneous requests is capped globally and per host
+    by the connector of the aiohttp session."""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def fetch(self, url):
+        """Downloads a page. Returns a (status, text) tuple."""
+        async with self.session.get(url, headers=HEADERS) as response:
+            return response.status, await response.text()
+
+    async def resolve(self, result, anime):
+        """Looks up the base episode url of an anime with the website's search."""
+        result.search_url = get_search_url(anime.title)
+        # download the search results page
+        _, search_page = await self.fetch(result.search_url)
+        result.base_episode_url, result.title_similarity = get_base_episode_url(search_page, get_titles(anime))
+        result.resolved = True
+
+    async def find_first_unaired_episode(self, result, ep_number):
+        """Returns the first episode from ep_number onwards that hasn't aired."""
+        search = EpisodeSearch(self, result.base_episode_url)
+        if getattr(settings, 'PROBER_EPISODE_SEARCH', 'galloping') == 'linear':
+            ep_number = await search.linear(ep_number)
+        else:
+            ep_number = await search.galloping(ep_number)
+        result.probes = result.probes + search.probes
+        return ep_number
+
+    async def probe(self, anime, base_episode_url=None):
+        """Finds the last aired episode of an anime. Returns a ProbeResult.
+        The search request is skipped when the base episode url is already known."""
+        result = ProbeResult(anime_id=anime.pk, base_episode_url=base_episode_url)
+        if result.base_episode_url is None:
+            await self.resolve(result, anime)
+            if result.base_episode_url is None:
+                return result
+
+        # starting from the last episode we know of, or otherwise episode 1,
+        # check whether the page corresponding to that specific episode exists
+        if anime.last_aired_episode is not None and anime.last_aired_episode != 0:
+            start = anime.last_aired_episode
+        else:
+            start = 1
+        ep_number = await self.find_first_unaired_episode(result, start)
+
+        # a known url without the last episode we know of is most likely stale, search again
+        if ep_number == start and start != 1 and not result.resolved:
+            cached_url = result.base_episode_url
+            await self.resolve(result, anime)
+            if result.base_episode_url is None:
+                return result
+            if result.base_episode_url != cached_url:
+                ep_number = await self.find_first_unaired_episode(result, start)
+
+        # neither ep_number nor ep_number + 1 exist
+        if ep_number > 1:
+            result.last_aired_episode = ep_number - 1
+        return result
+
+    async def probe_all(self, anime_list, base_episode_urls):
+        """Probes all the given anime concurrently. Returns a list of ProbeResults."""
+        async def probe_or_fail(anime):
+            try:
+                return await self.probe(anime, base_episode_urls.get(anime.pk))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                return ProbeResult(anime_id=anime.pk, error=error)
+
+        return await asyncio.gather(*(probe_or_fail(anime) for anime in anime_list))
+
+
+async def _probe_all(anime_list, base_episode_urls, limit, limit_per_host, timeout):
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host)
+    async with aiohttp.ClientSession(connector=connector,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        return await EpisodeProber(session).probe_all(anime_list, base_episode_urls)
+
+
+def probe_anime(anime_list, base_episode_urls=None):
+    """Probes the streaming website for all the given anime. Returns a list of ProbeResults.
+
+    base_episode_urls maps anime ids to already resolved base episode urls,
+    for which the search request is skipped. Concurrency is configured by the
+    PROBER_MAX_CONNECTIONS and PROBER_MAX_CONNECTIONS_PER_HOST settings."""
+    return asyncio.run(_probe_all(anime_list, base_episode_urls or {},
+                                  limit=getattr(settings, 'PROBER_MAX_CONNECTIONS', 10),
+                                  limit_per_host=getattr(settings, 'PROBER_MAX_CONNECTIONS_PER_HOST', 4),
+                                  timeout=getattr(settings, 'PROBER_TIMEOUT', 30)))
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.conf import settings
+
+from catalog.models import ProbeSchedule
+from catalog.predictor import predict_release_delay
+
+
+WEEK = timedelta(weeks=1)
+
+
+def get_broadcast(anime, now):
+    """Returns the broadcast datetime of the anime's episode closest to now,
+    or None if the broadcast time is unknown."""
+    if anime.airing_start is None:
+        return None
+    # episodes air weekly at the same time as the first one
+    weeks = round((now - anime.airing_start) / WEEK)
+    return anime.airing_start + max(weeks, 0) * WEEK
+
+
+def get_release_window(prediction, broadcast):
+    """Returns the (start, end) interval in which the episode broadcast at the
+    given time is expected to become available on the streaming website."""
+    # until enough releases of the anime have been seen, use the default window
+    if prediction is None:
+        expected_release = broadcast + timedelta(minutes=settings.PROBE_DEFAULT_RELEASE_DELAY)
+        return (expected_release - timedelta(minutes=settings.PROBE_WINDOW_BEFORE),
+                expected_release + timedelta(minutes=settings.PROBE_WINDOW_AFTER))
+    interval = timedelta(minutes=settings.PROBE_INTERVAL)
+    return broadcast + prediction.low - interval, broadcast + prediction.high + interval
+
+
+def get_next_probe_time(anime, schedule, prediction, now):
+    """Returns when the anime should be probed next.
+
+    Probes are PROBE_INTERVAL minutes apart inside the expected release window,
+    which is predicted from the anime's release history.
+    Once the window has passed, the interval grows with the delay up to PROBE_MAX_INTERVAL.
+    When this week's episode was already found, the next probe is at the start of next week's window."""
+    interval = timedelta(minutes=settings.PROBE_INTERVAL)
+    broadcast = get_broadcast(anime, now)
+    # without a broadcast time, probe every time
+    if broadcast is None:
+        return now + interval
+
+    window_start, window_end = get_release_window(prediction, broadcast)
+    # this week's episode was already found
+    if schedule.found_at is not None and schedule.found_at > broadcast - WEEK / 2:
+        return get_release_window(prediction, broadcast + WEEK)[0]
+    if now < window_start:
+        return window_start
+    if now <= window_end:
+        return now + interval
+    return now + min(max((now - window_end) / 2, interval), timedelta(minutes=settings.PROBE_MAX_INTERVAL))
+
+
+def get_due_anime(anime_by_id, now):
+    """Returns the ids of the anime that are due to be probed, most overdue first.
+    Anime that were never scheduled are due immediately."""
+    scheduled = ProbeSchedule.objects.filter(anime__in=anime_by_id.keys())
+    known = set(scheduled.values_list('anime_id', flat=True))
+    due = list(scheduled.filter(next_probe_at__lte=now).values_list('anime_id', flat=True))
+    return [anime_id for anime_id in anime_by_id if anime_id not in known] + due
+
+
+def reschedule(anime, found_new_episode, now):
+    """Updates the anime's next probe time after probing it."""
+    schedule = ProbeSchedule.objects.filter(anime=anime).first() or ProbeSchedule(anime=anime)
+    if found_new_episode:
+        schedule.found_at = now
+    schedule.next_probe_at = get_next_probe_time(anime, schedule, predict_release_delay(anime), now)
+    schedule.save()
+    return schedule
@@ -0,0 +1,73 @@
+import re
+
+from django.db import connection
+
+from catalog.models import Anime
+
+
+# FTS5 table indexing the title and synopsis of every anime, its rowid is the anime id
+FTS_TABLE = 'catalog_anime_fts'
+# number of anime written per INSERT statement
+INDEX_BATCH_SIZE = 100
+# number of ids per IN (...) list, below SQLite's limit on the number of query parameters
+ID_BATCH_SIZE = 500
+# bm25 weights of the title and synopsis columns, a match in the title ranks higher
+TITLE_WEIGHT = 10.0
+SYNOPSIS_WEIGHT = 1.0
+
+
+def get_match_query(query):
+    """Turns a user query into an FTS5 query matching the anime with words starting with all its words,
+    or returns None if the query has no words.
+
+    The words are quoted, so the FTS5 syntax (OR, NEAR, column filters...) can't be injected."""
+    words = re.findall(r'\w+', query.lower())
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def index_anime(anime_ids):
+    """Writes the current title and synopsis of the given anime to the search index."""
+    anime_ids = list(anime_ids)
+    rows = [row for i in range(0, len(anime_ids), ID_BATCH_SIZE)
+            for row in Anime.objects.filter(pk__in=anime_ids[i:i + ID_BATCH_SIZE])
+                                    .values_list('pk', 'title', 'synopsis')]
+    with connection.cursor() as cursor:
+        _delete(cursor, anime_ids)
+        for i in range(0, len(rows), INDEX_BATCH_SIZE):
+            batch = rows[i:i + INDEX_BATCH_SIZE]
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, title, synopsis) VALUES '
+                           + ', '.join(['(%s, %s, %s)'] * len(batch)),
+                           [value for pk, title, synopsis in batch for value in (pk, title, synopsis or '')])
+
+
+def unindex_anime(anime_ids):
+    """Removes the given anime from the search index."""
+    with connection.cursor() as cursor:
+        _delete(cursor, list(anime_ids))
+
+
+def _delete(cursor, anime_ids):
+    for i in range(0, len(anime_ids), ID_BATCH_SIZE):
+        batch = anime_ids[i:i + ID_BATCH_SIZE]
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(batch))})', batch)
+
+
+def search_anime_ids(query, limit, offset=0):
+    """Returns the ids of the anime matching the query, best match first."""
+    match_query = get_match_query(query)
+    if match_query is None:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                       f'ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s OFFSET %s',
+                       [match_query, TITLE_WEIGHT, SYNOPSIS_WEIGHT, limit, offset])
+        return [anime_id for anime_id, in cursor.fetchall()]
+
+
+def search_anime(query, limit, offset=0):
+    """Returns the anime cards matching the query, best match first."""
+    anime_ids = search_anime_ids(query, limit, offset)
+    anime = Anime.objects.cards().in_bulk(anime_ids)
+    return [anime[anime_id] for anime_id in anime_ids if anime_id in anime]
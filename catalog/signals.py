@@ -0,0 +1,181 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from notifications.models import Notification
+
+from catalog.counters import COUNTED_MODELS, refresh_anime_counts, refresh_anime_counts_of
+from catalog.facets import invalidate_facet_index
+from catalog.models import Anime, Genre, Season, Studio
+from catalog.notifier import invalidate_unread_counts
+from catalog.search import index_anime, unindex_anime
+from catalog.stats import invalidate_site_statistics
+from catalog.titles import invalidate_title_index
+from catalog.versions import bump_catalogue_version
+
+
+@receiver(connection_created)
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    """Applies the SQLITE_PRAGMAS settings to new SQLite connections."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(post_save, sender=Notification)
+def invalidate_unread_count(sender, instance, **kwargs):
+    invalidate_unread_counts([instance.recipient_id])
+
+
+@receiver(post_delete, sender=Notification)
+def invalidate_unread_count_after_delete(sender, instance, **kwargs):
+    # deleting a read notification doesn't change the unread count
+    if instance.unread:
+        invalidate_unread_counts([instance.recipient_id])
+
+
+@receiver(m2m_changed, sender=Anime.genres.through)
+@receiver(m2m_changed, sender=Anime.studios.through)
+def update_anime_counts(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Keeps the anime counts of genres/studios up to date when anime are linked to or unlinked from them."""
+    # reverse is True when the change was made from the genre/studio side (genre.anime_set.add(...))
+    counted_model = type(instance) if reverse else model
+    if action == 'pre_clear' and not reverse:
+        # remember the genres/studios that are about to lose the anime
+        _, field_name = COUNTED_MODELS[counted_model]
+        instance._cleared_pks = set(sender.objects.filter(anime_id=instance.pk).values_list(field_name, flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if reverse:
+            pks = [instance.pk]
+        elif action == 'post_clear':
+            pks = instance.__dict__.pop('_cleared_pks', set())
+        else:
+            pks = pk_set
+        refresh_anime_counts(counted_model, pks)
+
+
+@receiver(post_save, sender=Anime)
+def update_airing_anime_counts(sender, instance, created, update_fields, **kwargs):
+    """Recounts the airing anime of the anime's genres/studios, as its status may have changed.
+    A new anime isn't linked to anything yet."""
+    if not created and (update_fields is None or 'status' in update_fields):
+        refresh_anime_counts_of([instance.pk])
+
+
+@receiver(pre_delete, sender=Anime)
+def remember_counted_links(sender, instance, **kwargs):
+    # the links are deleted along with the anime without sending m2m_changed
+    instance._counted_pks = {model: set(through.objects.filter(anime_id=instance.pk)
+                                               .values_list(field_name, flat=True))
+                             for model, (through, field_name) in COUNTED_MODELS.items()}
+
+
+@receiver(post_delete, sender=Anime)
+def update_anime_counts_after_delete(sender, instance, **kwargs):
+    for model, pks in instance.__dict__.pop('_counted_pks', {}).items():
+        refresh_anime_counts(model, pks)
+
+
+@receiver(post_save, sender=Anime)
+@receiver(post_delete, sender=Anime)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Studio)
+@receiver(post_delete, sender=Studio)
+def invalidate_statistics(sender, **kwargs):
+    """Catalogue writes (the admin, the episode checker) change the home page counts."""
+    invalidate_site_statistics()
+
+
+@receiver(post_save, sender=Anime)
+def update_search_index(sender, instance, update_fields, **kwargs):
+    if update_fields is None or {'title', 'synopsis'} & set(update_fields):
+        index_anime([instance.pk])
+
+
+@receiver(post_delete, sender=Anime)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_anime([instance.pk])
+
+
+@receiver(post_save, sender=Anime)
+@receiver(post_delete, sender=Anime)
+def update_title_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'title', 'title_english', 'title_synonyms'} & set(update_fields):
+        invalidate_title_index()
+
+
+@receiver(post_save, sender=Anime)
+@receiver(post_delete, sender=Anime)
+@receiver(m2m_changed, sender=Anime.genres.through)
+@receiver(m2m_changed, sender=Anime.studios.through)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Studio)
+@receiver(post_delete, sender=Studio)
+@receiver(post_save, sender=Season)
+@receiver(post_delete, sender=Season)
+def update_facet_index(sender, update_fields=None, **kwargs):
+    """The facet values of the anime, or their names, may have changed."""
+    if not kwargs.get('action', 'post_').startswith('post_'):
+        return
+    # the index holds the facet values and the titles of the anime
+    if sender is not Anime or update_fields is None or \
+            {'season', 'status', 'air_day', 'type', 'title'} & set(update_fields):
+        invalidate_facet_index()
+
+
+@receiver(post_save, sender=Anime)
+@receiver(post_delete, sender=Anime)
+@receiver(m2m_changed, sender=Anime.genres.through)
+@receiver(m2m_changed, sender=Anime.studios.through)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Studio)
+@receiver(post_delete, sender=Studio)
+@receiver(post_save, sender=Season)
+@receiver(post_delete, sender=Season)
+def update_catalogue_version(sender, **kwargs):
+    """The API responses may have changed."""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        bump_catalogue_version()
+
+
+@receiver(m2m_changed, sender=Anime.genres.through)
+@receiver(m2m_changed, sender=Anime.studios.through)
+def touch_linked_anime(sender, instance, action, reverse, pk_set, **kwargs):
+    """The pages of an anime list its genres and studios."""
+    if not reverse:
+        if action.startswith('post_'):
+            Anime.objects.filter(pk=instance.pk).touch()
+    elif action == 'pre_clear':
+        instance._cleared_anime_ids = list(instance.anime_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        Anime.objects.filter(pk__in=pk_set).touch()
+    elif action == 'post_clear':
+        Anime.objects.filter(pk__in=instance.__dict__.pop('_cleared_anime_ids', [])).touch()
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Studio)
+@receiver(post_save, sender=Season)
+def touch_anime_of(sender, instance, created, **kwargs):
+    """The pages of the anime show the names of their genres, studios and season."""
+    if not created:
+        instance.anime_set.touch()
+
+
+@receiver(pre_delete, sender=Genre)
+@receiver(pre_delete, sender=Studio)
+@receiver(pre_delete, sender=Season)
+def remember_anime_of(sender, instance, **kwargs):
+    # the links are deleted (or the season unset) without sending signals
+    instance._anime_ids = list(instance.anime_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Studio)
+@receiver(post_delete, sender=Season)
+def touch_anime_after_delete(sender, instance, **kwargs):
+    Anime.objects.filter(pk__in=instance.__dict__.pop('_anime_ids', [])).touch()
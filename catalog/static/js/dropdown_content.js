@@ -1,7 +1,7 @@
 
 // Close the dropdown menu if the user clicks outside of it
 window.onclick = function(event) {
-  if (!event.target.matches('.clickable-dropbtn')) {
+  if (!event.target.matches('.clickable-dropbtn, .older-notifications')) {
     let dropdowns = document.getElementsByClassName("clickable-dropdown-content");
     let i;
     for (i = 0; i < dropdowns.length; i++) {
@@ -0,0 +1,37 @@
+from django.core.cache import cache
+
+from catalog.models import Anime, Genre, Studio
+
+
+SITE_STATISTICS_KEY = 'site-statistics'
+# the statistics are recomputed/invalidated whenever the catalogue is written, the timeout only bounds their staleness
+SITE_STATISTICS_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def compute_site_statistics():
+    """Counts the main objects of the catalogue."""
+    return {
+        'num_anime': Anime.objects.count(),
+        'num_seasonal_anime': Anime.objects.filter(status='air').count(),
+        'num_studios': Studio.objects.count(),
+        'num_genres': Genre.objects.count(),
+    }
+
+
+def get_site_statistics():
+    """Returns the catalogue counts shown on the home page, cached until the catalogue changes."""
+    statistics = cache.get(SITE_STATISTICS_KEY)
+    if statistics is None:
+        statistics = refresh_site_statistics()
+    return statistics
+
+
+def refresh_site_statistics():
+    """Recomputes the cached catalogue counts, after writes that don't send signals (bulk ingest)."""
+    statistics = compute_site_statistics()
+    cache.set(SITE_STATISTICS_KEY, statistics, SITE_STATISTICS_CACHE_TIMEOUT)
+    return statistics
+
+
+def invalidate_site_statistics():
+    cache.delete(SITE_STATISTICS_KEY)
@@ -0,0 +1,25 @@
+from django import template
+
+from catalog.cards import render_anime_cards
+from catalog.notifier import get_notifications_page, get_unread_count
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def unread_notifications_count(context):
+    """Returns the cached number of unread notifications of the current user."""
+    return get_unread_count(context['user'])
+
+
+@register.simple_tag(takes_context=True)
+def recent_notifications(context):
+    """Returns the first page of the current user's notifications."""
+    return get_notifications_page(context['user'])
+
+
+@register.simple_tag
+def anime_cards(anime_list):
+    """Returns (anime, card html) pairs with the cached cards of the anime.
+    The per-user watchlist buttons are rendered around them by the page."""
+    return render_anime_cards(anime_list)
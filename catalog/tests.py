@@ -1,3 +1,380 @@
-from django.test import TestCase
+import json
+import re
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from catalog.facets import FACETS, FacetIndex, parse_selection
+from catalog.models import Anime, Genre, Season
+from catalog.notifier import mark_all_as_read, notify_watchers
+from catalog.pagination import decode_cursor, encode_cursor, paginate_keyset
+from catalog.search import get_match_query, search_anime_ids
+from catalog.views import AnimeBrowseView
+
+
+# the tests don't touch the file based cache of the site
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_anime(pk, **fields):
+    """Creates an anime with the given fields, the required ones get placeholder values."""
+    return Anime.objects.create(**{
+        'id': pk,
+        'title': f'Anime {pk}',
+        'mal_url': f'https://myanimelist.net/anime/{pk}',
+        'image_url': f'https://cdn.myanimelist.net/images/anime/{pk}.jpg',
+        'type': 'TV',
+        'source': 'Manga',
+        'members': 10000,
+        'status': 'air',
+        **fields,
+    })
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogTestCase(TestCase):
+    """Test case starting every test with an empty cache, and so with fresh local indexes."""
+
+    def setUp(self):
+        cache.clear()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogTransactionTestCase(TransactionTestCase):
+    """CatalogTestCase whose transactions are committed, for the tests of what happens on commit."""
+
+    def setUp(self):
+        cache.clear()
+
+
+class KeysetPaginationTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # duplicated titles and members, the ids break the ties
+        for pk, (title, members) in enumerate([('b', 5), ('a', 7), ('c', 5), ('a', 9), ('d', 7), ('b', 1), ('e', 5)],
+                                              start=1):
+            create_anime(pk, title=title, members=members)
+
+    def get_pages(self, ordering, page_size):
+        """Returns the pages read forward from the first one, and the pages read back from the last one."""
+        pages = [paginate_keyset(Anime.objects.all(), ordering, page_size)]
+        while pages[-1].next_cursor is not None:
+            pages.append(paginate_keyset(Anime.objects.all(), ordering, page_size, after=pages[-1].next_cursor))
+        back_pages = [pages[-1]]
+        while back_pages[0].previous_cursor is not None:
+            back_pages.insert(0, paginate_keyset(Anime.objects.all(), ordering, page_size,
+                                                 before=back_pages[0].previous_cursor))
+        return pages, back_pages
+
+    def assertPagesMatch(self, ordering, page_size):
+        expected = list(Anime.objects.order_by(*ordering).values_list('pk', flat=True))
+        pages, back_pages = self.get_pages(ordering, page_size)
+        self.assertEqual([anime.pk for page in pages for anime in page.object_list], expected)
+        self.assertTrue(all(len(page.object_list) <= page_size for page in pages))
+        self.assertEqual([[anime.pk for anime in page.object_list] for page in back_pages],
+                         [[anime.pk for anime in page.object_list] for page in pages])
+        self.assertIsNone(pages[0].previous_cursor)
+
+    def test_forward_and_back(self):
+        self.assertPagesMatch(['title', 'id'], 2)
+        self.assertPagesMatch(['title', 'id'], 3)
+
+    def test_descending_field(self):
+        self.assertPagesMatch(['-members', 'id'], 2)
+        self.assertPagesMatch(['-members', '-id'], 3)
+
+    def test_single_page(self):
+        page = paginate_keyset(Anime.objects.all(), ['title', 'id'], 10)
+        self.assertEqual(len(page.object_list), 7)
+        self.assertIsNone(page.previous_cursor)
+        self.assertIsNone(page.next_cursor)
+
+    def test_cursor_round_trip(self):
+        anime = Anime.objects.get(pk=1)
+        self.assertEqual(decode_cursor(encode_cursor(anime, ['-members', 'id']), ['-members', 'id']), [5, 1])
+
+    def test_invalid_cursors(self):
+        nested = encode_cursor(Anime(title=['a'], id=1), ['title', 'id'])
+        for cursor in ['not a cursor', encode_cursor(Anime(id=1), ['id']), nested]:
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor, ['title', 'id'])
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get('/catalog/anime/', {'after': 'not a cursor'}).status_code, 404)
+        self.assertEqual(self.client.get('/catalog/anime/').status_code, 200)
+
+
+class SearchTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        create_anime(1, title='Kingdom', synopsis='A war orphan dreams of becoming a general under a dragon banner.')
+        create_anime(2, title='Dragon Quest: The Adventure of Dai', synopsis='A boy raised on a monster island.')
+        create_anime(3, title='Cooking with Valkyries', synopsis='A chef cooks for the gods.')
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(search_anime_ids('dragon', 10), [2, 1])
+
+    def test_words_are_prefixes_and_all_must_match(self):
+        self.assertEqual(search_anime_ids('drag', 10), [2, 1])
+        self.assertEqual(search_anime_ids('dragon island', 10), [2])
+        self.assertEqual(search_anime_ids('dragon chef', 10), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(get_match_query('title: war OR chef'), '"title"* "war"* "or"* "chef"*')
+        self.assertIsNone(get_match_query(' ?! '))
+        self.assertEqual(search_anime_ids('dragon*"', 10), [2, 1])
+        self.assertEqual(search_anime_ids('', 10), [])
+
+    def test_index_follows_the_anime(self):
+        anime = Anime.objects.get(pk=3)
+        anime.title = 'Cooking with Dragons'
+        anime.save()
+        self.assertEqual(search_anime_ids('valkyries', 10), [])
+        # the synopsis match ranks after the title matches
+        self.assertEqual(search_anime_ids('dragon', 10)[2:], [1])
+        self.assertEqual(sorted(search_anime_ids('dragon', 10)), [1, 2, 3])
+        anime.delete()
+        self.assertEqual(search_anime_ids('dragon', 10), [2, 1])
+
+    def test_view_pages(self):
+        response = self.client.get('/catalog/anime/search/', {'q': 'dragon'})
+        self.assertEqual([anime.pk for anime in response.context['anime_list']], [2, 1])
+        self.assertFalse(response.context['similar_titles'])
+        self.assertIsNone(response.context['next_page'])
+        self.assertEqual(self.client.get('/catalog/anime/search/', {'q': 'dragon', 'page': 2}).status_code, 200)
+        for page in ['0', 'x', '101', '99999999999999999999']:
+            self.assertEqual(self.client.get('/catalog/anime/search/', {'q': 'dragon', 'page': page}).status_code,
+                             404)
+
+    def test_similar_titles_when_nothing_matches(self):
+        response = self.client.get('/catalog/anime/search/', {'q': 'dragon qest'})
+        self.assertTrue(response.context['similar_titles'])
+        self.assertEqual(response.context['anime_list'][0].pk, 2)
+
+
+class FacetTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.action, self.comedy, self.drama = [Genre.objects.create(name=name)
+                                                for name in ('Action', 'Comedy', 'Drama')]
+        self.season = Season.objects.create(season='Spring', year=2021)
+        for pk, title, air_day, genres in [(1, 'd', 'Sat', [self.action, self.comedy]),
+                                           (2, 'a', 'Sun', [self.action]),
+                                           (3, 'c', 'Sat', [self.comedy]),
+                                           (4, 'b', 'Mon', [self.action, self.comedy, self.drama])]:
+            create_anime(pk, title=title, air_day=air_day, season=self.season).genres.set(genres)
+
+    def get_counts(self, response, facet):
+        values = dict(response.context['facets'])[FACETS[facet][0]]
+        return {facet_value.value: facet_value.count for facet_value, _ in values}
+
+    def test_index(self):
+        index = FacetIndex({1: 'd', 2: 'a', 3: 'c', 4: 'b'},
+                           {'genre': [(1, 'A'), (1, 'C'), (2, 'A'), (3, 'C'), (4, 'A'), (4, 'C')],
+                            'air_day': [(1, 'Sat'), (2, 'Sun'), (3, 'Sat'), (4, 'Mon')]},
+                           {'genre': {}, 'air_day': {}})
+        # several genres must all match, several days are alternatives
+        self.assertEqual(index.get_anime_ids(index.select({'genre': ['A', 'C']})), [1, 4])
+        self.assertEqual(index.get_anime_ids(index.select({'air_day': ['Sat', 'Sun']})), [1, 2, 3])
+        self.assertEqual(index.get_anime_ids(index.select({'genre': ['A'], 'air_day': ['Sat']})), [1])
+        # pages in (title, id) order
+        bitmap = index.select({})
+        self.assertEqual(index.get_page_anime_ids(bitmap, 2), [2, 4])
+        self.assertEqual(index.get_page_anime_ids(bitmap, 2, after=('b', 4)), [3, 1])
+        self.assertEqual(index.get_page_anime_ids(bitmap, 2, before=('c', 3)), [4, 2])
+        self.assertEqual(index.get_page_anime_ids(index.select({'genre': ['C']}), 5, after=('b', 4)), [3, 1])
+
+    def test_parse_selection(self):
+        self.assertEqual(parse_selection(QueryDict('genre=1&genre=2&air_day=Sat&q=x')),
+                         {'genre': [1, 2], 'air_day': ['Sat']})
+        with self.assertRaises(ValueError):
+            parse_selection(QueryDict('genre=action'))
+
+    def test_browse_selection_and_counts(self):
+        response = self.client.get('/catalog/anime/browse/', {'genre': self.action.pk, 'air_day': 'Sat'})
+        self.assertEqual([anime.pk for anime in response.context['anime_list']], [1])
+        # the genres are counted within the selection
+        self.assertEqual(self.get_counts(response, 'genre'), {self.action.pk: 1, self.comedy.pk: 1})
+        # the days are counted without the day filter, so that the other days stay selectable
+        self.assertEqual(self.get_counts(response, 'air_day'), {'Sat': 1, 'Sun': 1, 'Mon': 1})
+
+    @mock.patch.object(AnimeBrowseView, 'paginate_by', 2)
+    def test_browse_pages(self):
+        response = self.client.get('/catalog/anime/browse/', {'genre': self.action.pk})
+        first_page = response.context['page_obj']
+        self.assertEqual([anime.pk for anime in first_page.object_list], [2, 4])
+        self.assertIsNone(first_page.previous_cursor)
+        response = self.client.get('/catalog/anime/browse/', {'genre': self.action.pk, 'after': first_page.next_cursor})
+        last_page = response.context['page_obj']
+        self.assertEqual([anime.pk for anime in last_page.object_list], [1])
+        self.assertIsNone(last_page.next_cursor)
+        response = self.client.get('/catalog/anime/browse/', {'genre': self.action.pk,
+                                                              'before': last_page.previous_cursor})
+        self.assertEqual([anime.pk for anime in response.context['page_obj'].object_list], [2, 4])
+
+    def test_browse_invalid_filter(self):
+        self.assertEqual(self.client.get('/catalog/anime/browse/', {'genre': 'action'}).status_code, 404)
+        self.assertEqual(self.client.get('/catalog/anime/browse/', {'genre': 1, 'after': 'x'}).status_code, 404)
+
+
+class ApiTests(CatalogTransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.action, self.comedy = Genre.objects.create(name='Action'), Genre.objects.create(name='Comedy')
+        for pk in range(1, 6):
+            anime = create_anime(pk, status='fin' if pk == 5 else 'air', synopsis=f'Synopsis {pk}')
+            anime.genres.set([self.comedy, self.action] if pk == 1 else [self.comedy])
+
+    def get_json(self, url, data=None, status_code=200):
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, status_code)
+        return response.json()
+
+    def test_field_selection(self):
+        results = self.get_json('/catalog/api/anime/', {'fields': 'title,genres'})['results']
+        self.assertEqual(results[0], {'id': 1, 'title': 'Anime 1', 'genres': [self.action.pk, self.comedy.pk]})
+        self.assertEqual(len(results), 5)
+        default = self.get_json('/catalog/api/anime/')['results'][0]
+        self.assertEqual(set(default), {'id', 'title', 'image_url', 'status', 'members', 'score', 'air_day', 'season'})
+        self.assertIn('Unknown fields', self.get_json('/catalog/api/anime/', {'fields': 'title,password'},
+                                                      status_code=400)['error'])
+
+    def test_detail(self):
+        anime = self.get_json('/catalog/api/anime/1')
+        self.assertEqual(anime['synopsis'], 'Synopsis 1')
+        self.assertEqual(anime['genres'], [self.action.pk, self.comedy.pk])
+        self.assertEqual(self.get_json('/catalog/api/anime/1', {'fields': 'status'}), {'id': 1, 'status': 'air'})
+        self.get_json('/catalog/api/anime/99', status_code=404)
+        self.get_json('/catalog/api/users/1', status_code=404)
+
+    def test_filters_and_pages(self):
+        page = self.get_json('/catalog/api/anime/', {'status': 'air', 'limit': 3, 'fields': 'status'})
+        self.assertEqual([anime['id'] for anime in page['results']], [1, 2, 3])
+        page = self.get_json('/catalog/api/anime/', {'status': 'air', 'limit': 3, 'fields': 'status',
+                                                     'after': page['next_cursor']})
+        self.assertEqual([anime['id'] for anime in page['results']], [4])
+        self.assertIsNone(page['next_cursor'])
+        for limit in ['0', '201', 'x']:
+            self.get_json('/catalog/api/anime/', {'limit': limit}, status_code=400)
+
+    def test_export(self):
+        response = self.client.get('/catalog/api/anime/export', {'fields': 'title'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         [{'id': pk, 'title': f'Anime {pk}'} for pk in range(1, 6)])
+
+    def test_not_modified(self):
+        response = self.client.get('/catalog/api/anime/', HTTP_ACCEPT_ENCODING='gzip')
+        etag = response['ETag']
+        # strong and not compressed, the ETag identifies the bytes
+        self.assertFalse(etag.startswith('W/'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/catalog/api/anime/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # another url has another ETag
+        self.assertEqual(self.client.get('/catalog/api/anime/', {'limit': 2}, HTTP_IF_NONE_MATCH=etag).status_code,
+                         200)
+        # a committed change to the catalogue gives the pages a new version
+        anime = Anime.objects.get(pk=2)
+        anime.title = 'Renamed'
+        anime.save()
+        self.assertEqual(self.client.get('/catalog/api/anime/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ConditionalGetTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for pk in range(1, 4):
+            create_anime(pk)
+        self.user = User.objects.create_user('watcher', password='secret')
+
+    def get(self, url='/catalog/anime/', client=None, **headers):
+        return (client or self.client).get(url, **headers)
+
+    def assertNotModified(self, etag, url='/catalog/anime/', client=None):
+        self.assertEqual(self.get(url, client, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def assertModified(self, etag, url='/catalog/anime/', client=None):
+        self.assertEqual(self.get(url, client, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_anonymous_validators(self):
+        response = self.get()
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotModified(response['ETag'])
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        # the url is part of the ETag
+        self.assertModified(response['ETag'], url='/catalog/anime/airing/')
+
+    def test_anime_changes(self):
+        etag = self.get()['ETag']
+        anime = Anime.objects.get(pk=2)
+        anime.members += 1
+        anime.save()
+        self.assertModified(etag)
+
+        etag = self.get()['ETag']
+        # the newest anime is still there, only the count changes
+        Anime.objects.filter(pk=1).delete()
+        self.assertModified(etag)
+
+    def test_html_pages_are_compressed(self):
+        self.assertEqual(self.get(HTTP_ACCEPT_ENCODING='gzip')['Content-Encoding'], 'gzip')
+
+    def test_user_state(self):
+        self.client.force_login(self.user)
+        response = self.get()
+        # the user's data has no modification time
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        self.assertNotModified(etag)
+
+        self.user.userprofile.watchlist.add(Anime.objects.get(pk=1))
+        self.assertModified(etag)
+        etag = self.get()['ETag']
+
+        notify_watchers(Anime.objects.get(pk=1), sender=self.user, verb='Episode 2 is out', description='')
+        self.assertModified(etag)
+        etag = self.get()['ETag']
+
+        mark_all_as_read(self.user)
+        self.assertModified(etag)
+
+    def test_users_get_their_own_etag(self):
+        other_user = User.objects.create_user('other', password='secret')
+        self.client.force_login(self.user)
+        etag = self.get()['ETag']
+        other_client = Client()
+        other_client.force_login(other_user)
+        self.assertModified(etag, client=other_client)
+
+    def test_csrf_secret_rotated_by_login(self):
+        client = Client(enforce_csrf_checks=True)
+
+        def login():
+            token = client.get('/accounts/login/').context['csrf_token']
+            response = client.post('/accounts/login/', {'username': 'watcher', 'password': 'secret',
+                                                        'csrfmiddlewaretoken': str(token)})
+            self.assertEqual(response.status_code, 302)
+
+        login()
+        response = self.get(client=client)
+        etag = response['ETag']
+        token = re.search(r"'csrfmiddlewaretoken': '(\w+)'", response.content.decode()).group(1)
+        client.post('/accounts/logout/', {'csrfmiddlewaretoken': token})
+        login()
+        # the cached page holds a token of the old secret
+        response = self.get(client=client, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        token = re.search(r"'csrfmiddlewaretoken': '(\w+)'", response.content.decode()).group(1)
+        self.assertEqual(client.post('/catalog/update-watchlist/', {'anime_id': 1,
+                                                                   'csrfmiddlewaretoken': token}).status_code, 200)
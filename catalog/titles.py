@@ -0,0 +1,131 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from catalog.local_index import LocalIndex
+from catalog.models import Anime
+
+
+# bumped whenever a title changes, so that every process rebuilds its index
+TITLE_INDEX_VERSION_KEY = 'title-index-version'
+# minimum fraction of the trigrams of a query found in a title for it to match
+MIN_QUERY_COVERAGE = 0.5
+
+
+def normalize_title(title):
+    """Lowercases a title and strips its accents and punctuation."""
+    title = unicodedata.normalize('NFKD', title)
+    title = ''.join(char for char in title if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'[^\W_]+', title.lower()))
+
+
+def get_trigrams(title):
+    """Returns the set of trigrams of a normalized title. Words are padded with spaces, so that short
+    words and word boundaries count (unlike pg_trgm, there's a single leading space: the trigrams
+    made of the first letter alone would be in a large share of the titles)."""
+    trigrams = set()
+    for word in title.split():
+        word = f' {word} '
+        trigrams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return trigrams
+
+
+def similarity(title, other_title):
+    """Returns the trigram similarity (0 to 1) of two titles."""
+    trigrams, other_trigrams = get_trigrams(normalize_title(title)), get_trigrams(normalize_title(other_title))
+    if not trigrams or not other_trigrams:
+        return 0.0
+    shared = len(trigrams & other_trigrams)
+    return shared / (len(trigrams) + len(other_trigrams) - shared)
+
+
+def get_titles(anime):
+    """Returns all the known titles of an anime: the main one, the English one and the synonyms."""
+    titles = [anime.title]
+    if anime.title_english:
+        titles.append(anime.title_english)
+    titles.extend(anime.title_synonyms or [])
+    return titles
+
+
+class TitleIndex:
+    """In-memory trigram index of titles, for typo-tolerant title lookups.
+
+    Every title is an entry of the index. The entries sharing a trigram are listed
+    in its posting list, so only the titles sharing trigrams with the query are scored."""
+
+    def __init__(self, titles=()):
+        """titles is an iterable of (anime_id, title) pairs."""
+        self.anime_ids = []
+        # number of trigrams of every entry
+        self.sizes = []
+        self.postings = {}
+        for anime_id, title in titles:
+            self.add(anime_id, title)
+
+    def add(self, anime_id, title):
+        trigrams = get_trigrams(normalize_title(title))
+        if not trigrams:
+            return
+        entry = len(self.anime_ids)
+        self.anime_ids.append(anime_id)
+        self.sizes.append(len(trigrams))
+        for trigram in trigrams:
+            self.postings.setdefault(trigram, []).append(entry)
+
+    def __len__(self):
+        return len(self.anime_ids)
+
+    def search(self, query, limit=10, threshold=MIN_QUERY_COVERAGE):
+        """Returns up to limit (anime_id, score) pairs of the anime with a title similar to the query,
+        best first. Each anime appears once, with its best title.
+
+        The score is the fraction of the query trigrams found in the title, so that a few words
+        match a long title, and titles with the same score are ranked by their similarity."""
+        trigrams = get_trigrams(normalize_title(query))
+        if not trigrams:
+            return []
+        min_shared = max(math.ceil(threshold * len(trigrams)), 1)
+        # count the shared trigrams of every entry, Counter.update counts in C
+        shared = Counter()
+        for trigram in trigrams:
+            shared.update(self.postings.get(trigram, ()))
+
+        best = {}
+        for entry, count in shared.items():
+            if count < min_shared:
+                continue
+            score = (count / len(trigrams), count / (len(trigrams) + self.sizes[entry] - count))
+            anime_id = self.anime_ids[entry]
+            if score > best.get(anime_id, (0, 0)):
+                best[anime_id] = score
+        return [(anime_id, coverage) for anime_id, (coverage, _)
+                in sorted(best.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))[:limit]]
+
+
+def build_title_index():
+    """Builds the title index of the whole catalogue."""
+    return TitleIndex((anime_id, title)
+                      for anime_id, main_title, title_english, title_synonyms
+                      in Anime.objects.values_list('pk', 'title', 'title_english', 'title_synonyms').iterator()
+                      for title in [main_title, title_english, *(title_synonyms or [])] if title)
+
+
+title_index = LocalIndex(TITLE_INDEX_VERSION_KEY, build_title_index)
+
+
+def get_title_index():
+    """Returns this process' title index, rebuilt when the titles changed since it was built."""
+    return title_index.get()
+
+
+def invalidate_title_index():
+    title_index.invalidate()
+
+
+def search_titles(query, limit=10):
+    """Returns the anime cards whose titles are the most similar to the query."""
+    matches = get_title_index().search(query, limit)
+    anime = Anime.objects.cards().in_bulk([anime_id for anime_id, _ in matches])
+    return [anime[anime_id] for anime_id, _ in matches if anime_id in anime]
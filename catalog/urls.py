@@ -1,11 +1,13 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('anime/', views.AnimeListView.as_view(), name='anime'),
     path('anime/airing/', views.AiringAnimeListView.as_view(), name='airing-anime'),
+    path('anime/search/', views.AnimeSearchView.as_view(), name='anime-search'),
+    path('anime/browse/', views.AnimeBrowseView.as_view(), name='anime-browse'),
     path('anime/<int:pk>', views.AnimeDetailView.as_view(), name='anime-detail'),
     path('studio/', views.StudioListView.as_view(), name='studios'),
     path('studio/<int:pk>', views.StudioDetailView.as_view(), name='studio-detail'),
@@ -14,5 +16,11 @@ urlpatterns = [
     path('watchlist/', views.WatchlistListView.as_view(), name='my-watchlist'),
     path('update-watchlist/', views.update_watchlist, name='update-watchlist'),
     path('watchlist-remove/<int:pk>', views.watchlist_remove, name='watchlist-remove'),
+    path('notifications/', views.notification_list, name='notification-list'),
+    path('notifications/mark-all-read/', views.notifications_mark_all_read, name='notifications-mark-all-read'),
+    path('request-timings/', views.request_timings, name='request-timings'),
+    path('api/<str:resource>/', api.resource_list, name='api-list'),
+    path('api/<str:resource>/export', api.resource_export, name='api-export'),
+    path('api/<str:resource>/<int:pk>', api.resource_detail, name='api-detail'),
 ]
 
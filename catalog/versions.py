@@ -0,0 +1,23 @@
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+# changes whenever an anime, genre, studio or season is written, the API ETags are derived from it
+CATALOGUE_VERSION_KEY = 'catalogue-version'
+
+
+def get_catalogue_version():
+    """Returns the current version of the catalogue data."""
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    """Gives the catalogue a new version once the current transaction is committed,
+    so that a reader never gets the new version along with the old data."""
+    transaction.on_commit(lambda: cache.set(CATALOGUE_VERSION_KEY, uuid.uuid4().hex, None))
@@ -1,76 +1,218 @@
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views import generic
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
+from django.utils import formats, timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.decorators.http import require_POST
 
 import json
 
 from catalog.models import Genre, Season, Studio, Anime, UserProfile
+from catalog.conditional import ConditionalGetMixin
+from catalog.facets import FACETS, get_facet_index, parse_selection
 from catalog.forms import UserForm, UserProfileForm
+from catalog.instrumentation import BUCKETS, PHASES, get_request_timings, summarize_timings
+from catalog.notifier import get_notifications_page, mark_all_as_read
+from catalog.pagination import KeysetPaginationMixin, decode_cursor
+from catalog.search import search_anime
+from catalog.titles import search_titles
+from catalog.stats import get_site_statistics
+from catalog.visits import get_visit_count, record_visit
 
 
 def index(request):
     """View function for home page of site."""
 
-    # Generate counts of some of the main objects
-    num_anime = Anime.objects.count()
-    num_seasonal_anime = Anime.objects.filter(status='air').count()
-    num_studios = Studio.objects.count()
-    num_genres = Genre.objects.count()
-
-    # Number of visits to this view, as counted in the session variable.
-    num_visits = request.session.get('num_visits', 1)
-    request.session['num_visits'] = num_visits + 1
+    # Number of visits to this view, counted in memory and periodically added to the db by every process,
+    # so that reading the home page doesn't write the session.
+    record_visit('index')
+    num_visits = get_visit_count('index')
 
+    # Counts of some of the main objects, cached until the catalogue changes
     context = {
-        'num_anime': num_anime,
-        'num_seasonal_anime': num_seasonal_anime,
-        'num_studios': num_studios,
-        'num_genres': num_genres,
+        **get_site_statistics(),
         'num_visits': num_visits,
     }
 
     return render(request, 'index.html', context=context)
 
 
-class AnimeListView(generic.ListView):
-    model = Anime
+class WatchlistMixin:
+    """Adds the set of ids of the anime on the current user's watchlist to the context,
+    so that templates can check whether an anime is on the watchlist without a query."""
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.request.user.is_authenticated:
+            context['watchlist_ids'] = set(UserProfile.watchlist.through.objects
+                                           .filter(userprofile__user=self.request.user)
+                                           .values_list('anime_id', flat=True))
+        else:
+            context['watchlist_ids'] = set()
+        return context
+
+
+class AnimeListView(ConditionalGetMixin, WatchlistMixin, KeysetPaginationMixin, generic.ListView):
     context_object_name = 'anime_list'
     template_name = 'catalog/anime_list.html'
 
+    def get_queryset(self):
+        """Return all the anime."""
+        return Anime.objects.cards()
 
-class AiringAnimeListView(generic.ListView):
-    model = Anime
+
+class AiringAnimeListView(ConditionalGetMixin, WatchlistMixin, KeysetPaginationMixin, generic.ListView):
     context_object_name = 'anime_list'
     template_name = 'catalog/airing_anime_list.html'
 
+    def get_shown_anime(self):
+        return Anime.objects.filter(status='air')
 
-class AnimeDetailView(generic.DetailView):
+    def get_queryset(self):
+        """Return the currently airing anime."""
+        return Anime.objects.cards().filter(status='air')
+
+
+class AnimeBrowseView(WatchlistMixin, KeysetPaginationMixin, generic.ListView):
+    """Anime filtered by any combination of facet values (genre, studio, season, status, air day, type),
+    with the number of matching anime of every facet value, counted with the in-memory facet index."""
+    context_object_name = 'anime_list'
+    template_name = 'catalog/anime_browse.html'
+
+    def get_queryset(self):
+        try:
+            self.selection = parse_selection(self.request.GET)
+        except ValueError:
+            raise Http404('Invalid filter.')
+        self.facet_index = get_facet_index()
+        if not self.selection:
+            return Anime.objects.cards()
+        # only the anime of the page (and the one telling whether there's a next page) are queried,
+        # paginate_queryset orders them by the same (title, id) keys
+        try:
+            after, before = (tuple(decode_cursor(cursor, self.keyset_ordering)) if cursor is not None else None
+                             for cursor in (self.request.GET.get('after'), self.request.GET.get('before')))
+            anime_ids = self.facet_index.get_page_anime_ids(self.facet_index.select(self.selection),
+                                                            self.paginate_by + 1, after=after, before=before)
+        except (TypeError, ValueError):
+            raise Http404('Invalid page.')
+        return Anime.objects.cards().filter(pk__in=anime_ids)
+
+    def get_filter_query(self, facet=None, value=None):
+        """Returns the query string of the current selection, with the facet value toggled if given."""
+        query = self.request.GET.copy()
+        for cursor in ('after', 'before'):
+            query.pop(cursor, None)
+        if facet is not None:
+            values = query.getlist(facet)
+            query.setlist(facet, [v for v in values if v != str(value)] if str(value) in values
+                          else values + [str(value)])
+        return query.urlencode()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['facets'] = [(FACETS[facet][0], [(facet_value, self.get_filter_query(facet, facet_value.value))
+                                                 for facet_value in values])
+                             for facet, values in self.facet_index.count(self.selection).items()]
+        context['filter_query'] = self.get_filter_query()
+        return context
+
+
+class AnimeSearchView(WatchlistMixin, generic.ListView):
+    """Anime whose title or synopsis match the 'q' query, best match first,
+    or the anime with the most similar titles when nothing matches."""
+    context_object_name = 'anime_list'
+    template_name = 'catalog/anime_search.html'
+    page_size = 24
+    # deeper pages cost an OFFSET scan of all the matches before them
+    max_page = 100
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        try:
+            self.page_number = int(self.request.GET.get('page', 1))
+        except ValueError:
+            raise Http404('Invalid page.')
+        if not 1 <= self.page_number <= self.max_page:
+            raise Http404('Invalid page.')
+        # ranked results can't be paginated by keyset, but searches rarely go past the first pages
+        anime_list = search_anime(self.query, self.page_size + 1, (self.page_number - 1) * self.page_size)
+        self.has_next = len(anime_list) > self.page_size and self.page_number < self.max_page
+        # no word matched, the query may be misspelled: show the anime with the most similar titles
+        self.similar_titles = not anime_list and self.page_number == 1 and bool(self.query)
+        if self.similar_titles:
+            return search_titles(self.query, self.page_size)
+        return anime_list[:self.page_size]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        context['similar_titles'] = self.similar_titles
+        context['previous_page'] = self.page_number - 1 if self.page_number > 1 else None
+        context['next_page'] = self.page_number + 1 if self.has_next else None
+        return context
+
+
+class AnimeDetailView(ConditionalGetMixin, generic.DetailView):
     model = Anime
     template_name = 'catalog/anime_detail.html'
 
+    def get_shown_anime(self):
+        return Anime.objects.filter(pk=self.kwargs['pk'])
+
 
-class StudioListView(generic.ListView):
+class StudioListView(ConditionalGetMixin, generic.ListView):
+    """The anime counts of the studios change with any anime, the page is validated against all of them."""
     model = Studio
     template_name = 'catalog/studio_list.html'
 
+    def get_queryset(self):
+        return Studio.objects.filter(anime_count__gt=0)
+
 
-class StudioDetailView(generic.DetailView):
+class StudioDetailView(ConditionalGetMixin, WatchlistMixin, KeysetPaginationMixin, generic.DetailView):
     model = Studio
     template_name = 'catalog/studio_detail.html'
+    keyset_ordering = ['-members', 'id']
+
+    def get_shown_anime(self):
+        return Anime.objects.filter(studios=self.kwargs['pk'])
 
+    def get_context_data(self, **kwargs):
+        """Add a page of the studio's anime, most popular first."""
+        context = super().get_context_data(**kwargs)
+        _, context['page_obj'], context['anime_list'], context['is_paginated'] = \
+            self.paginate_queryset(self.object.anime_set.cards(), self.paginate_by)
+        return context
 
-class GenreListView(generic.ListView):
+
+class GenreListView(ConditionalGetMixin, generic.ListView):
+    """The anime counts of the genres change with any anime, the page is validated against all of them."""
     model = Genre
     template_name = 'catalog/genre_list.html'
 
+    def get_queryset(self):
+        return Genre.objects.filter(anime_count__gt=0).order_by('-anime_count', 'name')
+
 
-class GenreDetailView(generic.DetailView):
+class GenreDetailView(ConditionalGetMixin, WatchlistMixin, KeysetPaginationMixin, generic.DetailView):
     model = Genre
     template_name = 'catalog/genre_detail.html'
+    keyset_ordering = ['-members', 'id']
+
+    def get_shown_anime(self):
+        return Anime.objects.filter(genres=self.kwargs['pk'])
+
+    def get_context_data(self, **kwargs):
+        """Add a page of the genre's anime, most popular first."""
+        context = super().get_context_data(**kwargs)
+        _, context['page_obj'], context['anime_list'], context['is_paginated'] = \
+            self.paginate_queryset(self.object.anime_set.cards(), self.paginate_by)
+        return context
 
 
 class WatchlistListView(LoginRequiredMixin, generic.ListView):
@@ -82,7 +224,7 @@ class WatchlistListView(LoginRequiredMixin, generic.ListView):
 
     def get_queryset(self):
         """Return the watchlist of the current user."""
-        return UserProfile.objects.get(user=self.request.user).watchlist.all()
+        return UserProfile.objects.get(user=self.request.user).watchlist.cards()
 
 
 @permission_required('catalog.season.change', raise_exception=True)
@@ -183,3 +325,55 @@ def watchlist_remove(request, pk):
         watchlist.remove(anime)
 
     return render(request, 'catalog/user_profile.html')
+
+
+@login_required
+def notification_list(request):
+    """JSON list of the current user's notifications older than the 'before' notification id."""
+    before = request.GET.get('before', None)
+    if before is not None and not before.isdigit():
+        return HttpResponseBadRequest()
+    page = get_notifications_page(request.user, before=before)
+    notifications = [{
+        'id': notification.id,
+        'verb': notification.verb,
+        'description': notification.description,
+        'timestamp': formats.date_format(timezone.localtime(notification.timestamp), 'DATETIME_FORMAT'),
+        'unread': notification.unread,
+    } for notification in page.notifications]
+
+    return HttpResponse(json.dumps({'notifications': notifications, 'next_cursor': page.next_cursor}),
+                        content_type='application/json')
+
+
+@login_required
+def inbox_mark_all_as_read(request):
+    """Replaces the django-notifications inbox view, which marks the notifications as read
+    with a queryset update that leaves the cached unread count stale."""
+    mark_all_as_read(request.user)
+
+    next_url = request.GET.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('notifications:unread')
+
+
+@login_required
+@require_POST
+def notifications_mark_all_read(request):
+    """POST method for marking all the current user's notifications as read."""
+    mark_all_as_read(request.user)
+
+    return HttpResponse(json.dumps({'unread_count': 0}), content_type='application/json')
+
+
+@staff_member_required
+def request_timings(request):
+    """JSON summary and histograms of the request timings of every url name, for the admins."""
+    timings = get_request_timings()
+    return HttpResponse(json.dumps({
+        'buckets_ms': BUCKETS,
+        'url_names': {url_name: {**summarize_timings(url_timings), 'histograms': {phase: url_timings[phase]
+                                                                                  for phase in PHASES}}
+                      for url_name, url_timings in sorted(timings.items())},
+    }), content_type='application/json')
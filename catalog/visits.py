@@ -0,0 +1,86 @@
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+
+from catalog.models import VisitCounter
+
+
+# seconds between the writes of a process' visits to the db, the most visits a killed process can lose
+FLUSH_INTERVAL = 60
+
+
+def visit_total_key(name):
+    return f'visits-total-{name}'
+
+
+# visits counted by this process since its last flush
+_pending_visits = Counter()
+_lock = threading.Lock()
+# id of the process whose flusher thread is running, a forked process starts its own
+_flusher_pid = None
+
+
+def record_visit(name):
+    """Counts a visit to a page in this process' memory, without touching the database or the cache
+    (the file based cache has no atomic increment). A thread adds the process' visits to the VisitCounter
+    table every FLUSH_INTERVAL seconds, and they're flushed when the process exits."""
+    global _flusher_pid
+    with _lock:
+        _pending_visits[name] += 1
+        start_flusher = _flusher_pid != os.getpid()
+        _flusher_pid = os.getpid()
+    if start_flusher:
+        threading.Thread(target=flush_periodically, name='visit-flusher', daemon=True).start()
+        atexit.register(flush_visits)
+
+
+def flush_periodically():
+    """Flushes this process' visits every FLUSH_INTERVAL seconds, run by the flusher thread."""
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush_visits()
+        except Exception:
+            # the visits are kept if the database is down, only the cache can fail here: try again later
+            pass
+        finally:
+            # the thread's connection would stay open between the flushes
+            connection.close()
+
+
+def get_visit_count(name):
+    """Returns the number of visits to a page: the flushed ones and the ones of this process still in memory."""
+    total = cache.get(visit_total_key(name))
+    if total is None:
+        total = VisitCounter.objects.filter(name=name).values_list('visits', flat=True).first() or 0
+        cache.set(visit_total_key(name), total, None)
+    with _lock:
+        return total + _pending_visits[name]
+
+
+def flush_visits():
+    """Adds this process' visits to the VisitCounter table, one UPDATE per page.
+    If the write fails, the visits are kept for the next flush. Returns the number of visits written."""
+    global _pending_visits
+    with _lock:
+        pending_visits, _pending_visits = _pending_visits, Counter()
+    if not pending_visits:
+        return 0
+    try:
+        with transaction.atomic():
+            for name, visits in pending_visits.items():
+                VisitCounter.objects.get_or_create(name=name)
+                VisitCounter.objects.filter(name=name).update(visits=F('visits') + visits)
+    except DatabaseError:
+        with _lock:
+            _pending_visits.update(pending_visits)
+        return 0
+    # the totals are read again from the table, other processes may have written to it too
+    cache.delete_many([visit_total_key(name) for name in pending_visits])
+    return sum(pending_visits.values())